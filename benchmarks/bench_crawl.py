@@ -0,0 +1,192 @@
+"""
+بنچمارک انتها-به-انتهای run_crawl_task در برابر شبیه‌ساز محلی مدیاویکی، با PostgreSQL و Redis محلی.
+
+برای هر تنظیم هم‌زمانی یک پردازه جدا اجرا می‌شود (تا peak RSS مستقل باشد) و خروجی JSON شامل
+pages/sec، تأخیر p50/p99 هر job، ردیف دیتابیس در ثانیه و peak RSS است.
+
+اجرا (DATABASE_URL باید به یک دیتابیس مخصوص بنچمارک اشاره کند):
+    python -m benchmarks.bench_crawl --concurrency 1 5 10 --jobs 20 --max-results 100 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def wait_for_port(host: str, port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Mock server did not start on {host}:{port}")
+
+
+async def run_child(args) -> dict:
+    """یک تنظیم را اجرا می‌کند؛ تنظیمات ورکر پیش از import از متغیرهای محیطی خوانده شده‌اند."""
+    from arq import create_pool
+    from shared import database
+    from server import worker
+
+    await database.create_db_and_tables_async()
+    ctx = {"redis": await create_pool(worker.redis_settings)}
+    await worker.startup(ctx)
+
+    run_id = uuid.uuid4().hex[:8]
+    latencies = []
+    limiter = asyncio.Semaphore(args.parallel_jobs)
+
+    async def run_one(index: int) -> dict:
+        async with limiter:
+            job_ctx = dict(ctx, job_id=f"bench-{run_id}-{index}")
+            task_details = {
+                "crawler_name": "wikipedia",
+                "params": {"search_term": f"bench {run_id} {index}", "max_results": args.max_results},
+            }
+            started = time.perf_counter()
+            result = await worker.run_crawl_task(job_ctx, task_details)
+            latencies.append(time.perf_counter() - started)
+            return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_one(index) for index in range(args.jobs)))
+    elapsed = time.perf_counter() - started
+
+    await worker.shutdown(ctx)
+    await ctx["arq_pool"].close()
+
+    found = sum(result.get("found", 0) for result in results)
+    saved = sum(result.get("saved", 0) for result in results)
+    return {
+        "concurrency": args.child_concurrency,
+        "jobs": args.jobs,
+        "failed_jobs": sum(1 for result in results if result.get("status") != "success"),
+        "elapsed_seconds": round(elapsed, 3),
+        "pages": found,
+        "pages_per_second": round(found / elapsed, 2) if elapsed else 0.0,
+        "db_rows": saved,
+        "db_rows_per_second": round(saved / elapsed, 2) if elapsed else 0.0,
+        "job_latency_p50_seconds": round(percentile(latencies, 0.50), 3),
+        "job_latency_p99_seconds": round(percentile(latencies, 0.99), 3),
+        # ru_maxrss در لینوکس بر حسب کیلوبایت است
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_setting(args, concurrency: int, mock_url: str) -> dict:
+    env = dict(
+        os.environ,
+        WIKIPEDIA_BASE_URL=mock_url,
+        HTTP_CACHE_BACKEND="none",
+        REFRESH_INTERVAL_MINUTES="0",
+        WORKER_METRICS_PORT="0",
+        CRAWL_JOB_CONCURRENCY=str(concurrency),
+        CRAWL_MAX_CONCURRENCY=str(concurrency * args.parallel_jobs),
+        CRAWL_RATE_PER_SECOND=str(args.rate),
+        CRAWL_BURST=str(args.rate),
+        HTTP_MAX_CONNECTIONS=str(max(10, concurrency * args.parallel_jobs)),
+    )
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as handle:
+        result_path = handle.name
+
+    command = [
+        sys.executable, "-m", "benchmarks.bench_crawl", "--child",
+        "--child-concurrency", str(concurrency),
+        "--result-file", result_path,
+        "--jobs", str(args.jobs),
+        "--parallel-jobs", str(args.parallel_jobs),
+        "--max-results", str(args.max_results),
+    ]
+    # خروجی print کراولر و ورکر در بنچمارک دور ریخته می‌شود
+    subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+    with open(result_path) as handle:
+        result = json.load(handle)
+    os.unlink(result_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end crawler benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 10],
+                        help="مقادیر CRAWL_JOB_CONCURRENCY که مقایسه می‌شوند")
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--parallel-jobs", type=int, default=2, help="تعداد job هم‌زمان (مثل max_jobs ورکر)")
+    parser.add_argument("--max-results", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1000, help="سقف درخواست در ثانیه limiter")
+    parser.add_argument("--mock-url", help="استفاده از شبیه‌ساز در حال اجرا به جای راه‌اندازی خودکار")
+    parser.add_argument("--mock-port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--extract-bytes", type=int, default=20000)
+    parser.add_argument("--output", help="مسیر فایل JSON خروجی (پیش‌فرض: stdout)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--child-concurrency", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = asyncio.run(run_child(args))
+        with open(args.result_file, "w") as handle:
+            json.dump(result, handle)
+        return
+
+    mock_process = None
+    mock_url = args.mock_url
+    if not mock_url:
+        mock_process = subprocess.Popen([
+            sys.executable, "-m", "benchmarks.mock_mediawiki",
+            "--port", str(args.mock_port),
+            "--latency-ms", str(args.latency_ms),
+            "--error-rate", str(args.error_rate),
+            "--extract-bytes", str(args.extract_bytes),
+        ])
+        wait_for_port("127.0.0.1", args.mock_port)
+        mock_url = f"http://127.0.0.1:{args.mock_port}"
+
+    try:
+        results = [run_setting(args, concurrency, mock_url) for concurrency in args.concurrency]
+    finally:
+        if mock_process:
+            mock_process.terminate()
+            mock_process.wait()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            "jobs": args.jobs,
+            "parallel_jobs": args.parallel_jobs,
+            "max_results": args.max_results,
+            "latency_ms": args.latency_ms,
+            "error_rate": args.error_rate,
+            "extract_bytes": args.extract_bytes,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+میکروبنچمارک مسیر پارس: json استاندارد + BeautifulSoup (مسیر قدیمی) در برابر server.parsing
+(orjson در صورت نصب بودن + حذف تگ با regex)، و بیشترین تأخیر event loop هنگام پارس درجا
+در برابر پارس بیرون از loop (thread pool یا process pool).
+
+اجرا:
+    python -m benchmarks.bench_parsing --pages 20 --extract-bytes 200000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.mock_mediawiki import MockSettings, details, search
+from server import parsing
+from server.crawler import BaseCrawler
+
+
+def legacy_parse_search(content: str) -> list[dict]:
+    from bs4 import BeautifulSoup
+
+    articles = []
+    for item in json.loads(content).get("query", {}).get("search", []):
+        summary = BeautifulSoup(item.get("snippet"), "html.parser").get_text(strip=True)
+        if item.get("title") and summary and item.get("pageid"):
+            articles.append({"pageid": item["pageid"], "title": item["title"], "summary": summary})
+    return articles
+
+
+def legacy_parse_details(content: str) -> tuple[dict, dict]:
+    # مسیر قدیمی continue را با یک json.loads جداگانه روی کل پاسخ می‌خواند
+    pages = json.loads(content).get("query", {}).get("pages", {})
+    continue_params = json.loads(content).get("continue", {})
+    return {
+        int(page_id): {
+            "full_text": page.get("extract"),
+            "url": page.get("fullurl"),
+            "lastrevid": page.get("lastrevid"),
+            "touched": parsing.parse_timestamp(page.get("touched")),
+        }
+        for page_id, page in pages.items()
+    }, continue_params
+
+
+def best_of(function, content: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(content)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+async def max_loop_lag(parse, payloads: list[str]) -> float:
+    """هم‌زمان با پارس، یک تیکر هر 1ms بیدار می‌شود؛ بیشترین تأخیر بیداری برگردانده می‌شود."""
+    lag = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal lag
+        while running:
+            expected = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - expected)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await asyncio.gather(*(parse(payload) for payload in payloads))
+    running = False
+    await task
+    return lag
+
+
+async def measure_loop_lag(payloads: list[str], processes: int, rounds: int = 5) -> dict:
+    """
+    میانه بیشترین تأخیر loop در چند دور؛ payloadها هم‌زمان پارس می‌شوند (مثل دسته‌های هم‌زمان جزئیات).
+    processes=0 یعنی thread pool پیش‌فرض، در غیر این صورت ProcessPoolExecutor مثل ورکر.
+    """
+    executor = None
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("forkserver"))
+        # راه‌اندازی پردازه‌ها در اندازه‌گیری حساب نشود
+        list(executor.map(parsing.loads, ["{}"] * processes))
+    crawler = BaseCrawler(base_url="http://bench.local", parse_executor=executor)
+
+    async def inline(content):
+        return parsing.parse_details_response(content)
+
+    async def offloaded(content):
+        return await crawler.parse_payload(parsing.parse_details_response, content)
+
+    try:
+        report = {}
+        for name, parse in (("inline", inline), ("offloaded", offloaded)):
+            lags = sorted([await max_loop_lag(parse, payloads) for _ in range(rounds)])
+            report[f"{name}_max_lag_ms"] = round(lags[len(lags) // 2] * 1000, 2)
+        return report
+    finally:
+        await crawler.close()
+        if executor:
+            executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parsing micro-benchmark")
+    parser.add_argument("--pages", type=int, default=20, help="تعداد صفحه در هر پاسخ جزئیات")
+    parser.add_argument("--extract-bytes", type=int, default=200_000)
+    parser.add_argument("--search-results", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=2,
+                        help="اندازه process pool برای اندازه‌گیری تأخیر loop (0 = thread pool)")
+    args = parser.parse_args()
+
+    settings = MockSettings(extract_bytes=args.extract_bytes, extracts_per_response=args.pages)
+    details_payload = json.dumps(details({"pageids": "|".join(str(i) for i in range(1, args.pages + 1)),
+                                          "prop": "extracts|info"}, settings))
+    search_payload = json.dumps(search({"srsearch": "benchmark", "srlimit": args.search_results}, settings))
+
+    timings = {
+        "search_legacy_ms": best_of(legacy_parse_search, search_payload, args.repeat),
+        "search_fast_ms": best_of(parsing.parse_search_response, search_payload, args.repeat),
+        "details_legacy_ms": best_of(legacy_parse_details, details_payload, args.repeat),
+        "details_fast_ms": best_of(parsing.parse_details_response, details_payload, args.repeat),
+    }
+    report = {
+        "json_backend": "orjson" if parsing.orjson is not None else "json",
+        "details_payload_bytes": len(details_payload),
+        "search_payload_bytes": len(search_payload),
+        **{name: round(value * 1000, 3) for name, value in timings.items()},
+        "search_speedup": round(timings["search_legacy_ms"] / timings["search_fast_ms"], 1),
+        "details_speedup": round(timings["details_legacy_ms"] / timings["details_fast_ms"], 1),
+        "offload_executor": f"process x{args.processes}" if args.processes else "thread",
+        **asyncio.run(measure_loop_lag([details_payload] * 4, args.processes)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
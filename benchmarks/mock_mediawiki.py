@@ -0,0 +1,157 @@
+"""
+شبیه‌ساز محلی API مدیاویکی برای بنچمارک کراولر.
+
+از list=search (با sroffset/continue)، prop=extracts|info (با excontinue)، prop=info و
+generator=links/linkshere پشتیبانی می‌کند. تأخیر، نرخ خطا و اندازه متن قابل تنظیم است.
+
+اجرا:
+    python -m benchmarks.mock_mediawiki --port 8765 --latency-ms 50 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+class MockSettings:
+
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 10, error_rate: float = 0.0,
+                 extract_bytes: int = 20000, total_hits: int = 10000, extracts_per_response: int = 1,
+                 links_per_page: int = 20):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.extract_bytes = extract_bytes
+        self.total_hits = total_hits
+        # مثل TextExtracts واقعی: بدون exintro فقط یک متن کامل در هر پاسخ و بقیه با excontinue
+        self.extracts_per_response = extracts_per_response
+        self.links_per_page = links_per_page
+
+
+FILLER = "The quick brown fox jumps over the lazy dog. " * 64
+
+
+def term_base_id(term: str) -> int:
+    """
+    هر عبارت جستجو بازه pageid مخصوص خودش را دارد تا اجراهای مختلف ردیف جدید بسازند
+    (در محدوده ستون Integer pageid).
+    """
+    return int(hashlib.sha1(term.encode("utf-8")).hexdigest()[:4], 16) * 20_000 + 1
+
+
+def make_extract(page_id: int, size: int) -> str:
+    header = f"Article {page_id}\n"
+    body = FILLER * (size // len(FILLER) + 1)
+    return (header + body)[:max(size, len(header))]
+
+
+def create_app(settings: MockSettings) -> FastAPI:
+    app = FastAPI(title="Mock MediaWiki API")
+
+    @app.get("/w/api.php")
+    async def api(request: Request):
+        params = request.query_params
+        delay = max(0.0, random.gauss(settings.latency_ms, settings.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        if random.random() < settings.error_rate:
+            return Response(status_code=503, headers={"Retry-After": "0"})
+
+        if params.get("list") == "search":
+            return JSONResponse(search(params, settings))
+        if params.get("generator") in ("links", "linkshere"):
+            return JSONResponse(links(params, settings))
+        if "pageids" in params:
+            return JSONResponse(details(params, settings))
+        return JSONResponse({"error": {"code": "badvalue", "info": "Unsupported mock request"}})
+
+    return app
+
+
+def search(params, settings: MockSettings) -> dict:
+    term = params.get("srsearch", "")
+    limit = int(params.get("srlimit", 10))
+    offset = int(params.get("sroffset", 0))
+    base = term_base_id(term)
+    end = min(offset + limit, settings.total_hits)
+
+    results = [
+        {
+            "ns": 0,
+            "pageid": base + index,
+            "title": f"{term} {index}",
+            "snippet": f'<span class="searchmatch">{term}</span> result {index} &amp; more',
+            "timestamp": "2024-01-01T00:00:00Z",
+        }
+        for index in range(offset, end)
+    ]
+    data = {"batchcomplete": "", "query": {"searchinfo": {"totalhits": settings.total_hits}, "search": results}}
+    if end < settings.total_hits:
+        data["continue"] = {"sroffset": end, "continue": "-||"}
+    return data
+
+
+def details(params, settings: MockSettings) -> dict:
+    page_ids = [int(page_id) for page_id in params["pageids"].split("|")]
+    with_extracts = "extracts" in params.get("prop", "")
+    start = int(params.get("excontinue", 0))
+
+    pages = {}
+    for index, page_id in enumerate(page_ids):
+        page = {
+            "pageid": page_id,
+            "ns": 0,
+            "title": f"Page {page_id}",
+            "lastrevid": page_id * 10,
+            "touched": "2024-01-01T00:00:00Z",
+            "fullurl": f"https://mock.wikipedia.local/wiki/Page_{page_id}",
+        }
+        if with_extracts and start <= index < start + settings.extracts_per_response:
+            page["extract"] = make_extract(page_id, settings.extract_bytes)
+        pages[str(page_id)] = page
+
+    data = {"batchcomplete": "", "query": {"pages": pages}}
+    if with_extracts and start + settings.extracts_per_response < len(page_ids):
+        data["continue"] = {"excontinue": start + settings.extracts_per_response, "continue": "||info"}
+    return data
+
+
+def links(params, settings: MockSettings) -> dict:
+    page_ids = [int(page_id) for page_id in params["pageids"].split("|")]
+    pages = {}
+    for page_id in page_ids:
+        for offset in range(1, settings.links_per_page + 1):
+            target = (page_id * 31 + offset) % 2_000_000_000 + 1
+            pages[str(target)] = {"pageid": target, "ns": 0, "title": f"Page {target}"}
+    return {"batchcomplete": "", "query": {"pages": pages}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock MediaWiki API for crawler benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--extract-bytes", type=int, default=20000)
+    parser.add_argument("--total-hits", type=int, default=10000)
+    parser.add_argument("--extracts-per-response", type=int, default=1)
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        extract_bytes=args.extract_bytes,
+        total_hits=args.total_hits,
+        extracts_per_response=args.extracts_per_response
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
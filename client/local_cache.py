@@ -0,0 +1,118 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".wiki_crawler", "articles.sqlite3")
+
+
+class LocalArticleCache:
+    """
+    کش محلی مقالات روی SQLite (کلید: pageid) برای بارگیری فوری و مرور آفلاین.
+    لیست از /articles/changes به‌صورت افزایشی همگام می‌شود؛ full_text فقط برای
+    مقالاتی ذخیره می‌شود که کاربر باز کرده است.
+    هر متد اتصال خودش را باز می‌کند تا از thread اصلی Tk و thread همگام‌سازی قابل استفاده باشد.
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS articles (
+            pageid INTEGER PRIMARY KEY,
+            id INTEGER NOT NULL,
+            title TEXT,
+            summary TEXT,
+            url TEXT,
+            full_text TEXT,
+            updated_at TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_articles_id ON articles (id)",
+        "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)",
+    ]
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            # WAL: خواندن لیست در حین نوشتن همگام‌سازی مسدود نمی‌شود
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def upsert_articles(self, items: List[Dict[str, Any]]) -> int:
+        """
+        ردیف‌های دلتا را ادغام می‌کند؛ اگر updated_at عوض شده باشد full_text کش‌شده کهنه است و پاک می‌شود.
+        خروجی: تعداد ردیف‌های جدید یا تغییرکرده (ردیف‌های تکراری پنجره همپوشانی همگام‌سازی شمرده نمی‌شوند).
+        """
+        if not items:
+            return 0
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT INTO articles (pageid, id, title, summary, url, updated_at)
+                VALUES (:pageid, :id, :title, :summary, :url, :updated_at)
+                ON CONFLICT (pageid) DO UPDATE SET
+                    id = excluded.id,
+                    title = excluded.title,
+                    summary = excluded.summary,
+                    url = excluded.url,
+                    full_text = NULL,
+                    updated_at = excluded.updated_at
+                WHERE articles.updated_at IS NOT excluded.updated_at
+                """,
+                [
+                    {key: item.get(key) for key in ("pageid", "id", "title", "summary", "url", "updated_at")}
+                    for item in items
+                ]
+            )
+            return conn.total_changes - before
+
+    def page(self, before_id: int | None = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """صفحه‌بندی keyset روی id نزولی (جدیدترین مقالات اول)، بدون full_text."""
+        query = "SELECT pageid, id, title, summary, url FROM articles"
+        params: tuple = ()
+        if before_id is not None:
+            query += " WHERE id < ?"
+            params = (before_id,)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query, params + (limit,))]
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT count(*) FROM articles").fetchone()[0]
+
+    def get_full_text(self, pageid: int) -> str | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT full_text FROM articles WHERE pageid = ?", (pageid,)).fetchone()
+        return row["full_text"] if row else None
+
+    def set_full_text(self, pageid: int, full_text: str | None):
+        with self._connect() as conn:
+            conn.execute("UPDATE articles SET full_text = ? WHERE pageid = ?", (full_text, pageid))
+
+    def get_sync_state(self) -> tuple[str | None, int]:
+        """(since, after_id) آخرین همگام‌سازی موفق."""
+        with self._connect() as conn:
+            state = dict(conn.execute("SELECT key, value FROM sync_state").fetchall())
+        return state.get("since"), int(state.get("after_id") or 0)
+
+    def set_sync_state(self, since: str | None, after_id: int):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                [("since", since), ("after_id", str(after_id))]
+            )
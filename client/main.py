@@ -1,8 +1,10 @@
+import json
 import os
 import sys
 import threading
 import time
 import tkinter as tk
+from datetime import datetime, timedelta
 from tkinter import ttk, scrolledtext, messagebox
 import requests
 from typing import List, Dict, Any
@@ -13,7 +15,17 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
 sys.path.append(project_root)
 
-from shared import database
+from client.local_cache import DEFAULT_CACHE_PATH, LocalArticleCache
+
+
+# تعداد ردیف هر صفحه از کش محلی؛ صفحه بعد وقتی اضافه می‌شود که اسکرول به انتهای لیست نزدیک شود
+ARTICLE_PAGE_SIZE = 100
+LOAD_MORE_SCROLL_THRESHOLD = 0.9
+# اندازه هر درخواست /articles/changes
+SYNC_PAGE_SIZE = 1000
+# تراکنش‌هایی که دیرتر commit می‌شوند ممکن است updated_at کمی قدیمی‌تر داشته باشند؛
+# هر همگام‌سازی این بازه را دوباره می‌خواند (ادغام بر اساس pageid idempotent است)
+SYNC_OVERLAP_SECONDS = 120
 
 
 class CrawlerApp(tk.Tk):
@@ -25,6 +37,11 @@ class CrawlerApp(tk.Tk):
 
 
         self.articles_data_map: Dict[str, Any] = {}
+        # لیست صفحه‌ای از کش محلی: id آخرین ردیف نمایش‌داده‌شده (cursor صفحه بعد)
+        self.next_cursor: int | None = None
+        self.has_more_articles = False
+        self.sync_running = False
+        self.cache = LocalArticleCache(os.getenv("CLIENT_CACHE_PATH", DEFAULT_CACHE_PATH))
 
 
         self.main_frame = ttk.Frame(self, padding="10")
@@ -55,8 +72,8 @@ class CrawlerApp(tk.Tk):
                                          command=self.start_wiki_job_thread)
         self.btn_crawl_wiki.pack(side=tk.LEFT, padx=5)
 
-        self.btn_load_wiki = ttk.Button(input_frame, text="بارگیری از پایگاه داده (Sync)",
-                                        command=self.load_articles_from_db)
+        self.btn_load_wiki = ttk.Button(input_frame, text="بارگیری مقالات",
+                                        command=self.load_articles)
         self.btn_load_wiki.pack(side=tk.LEFT, padx=5)
 
 
@@ -78,7 +95,13 @@ class CrawlerApp(tk.Tk):
 
         # افزودن اسکرول‌بار به جدول
         tree_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=tree_scrollbar.set)
+
+        def on_tree_scroll(first, last):
+            tree_scrollbar.set(first, last)
+            if float(last) >= LOAD_MORE_SCROLL_THRESHOLD:
+                self.load_next_page()
+
+        self.tree.configure(yscrollcommand=on_tree_scroll)
 
         tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -104,42 +127,66 @@ class CrawlerApp(tk.Tk):
             article_data = self.articles_data_map.get(selected_item_id)
 
             if article_data:
-
-                content = (
-                    f"عنوان: {article_data.title}\n"
-                    f"PageID: {article_data.pageid}\n"
-                    f"URL: {article_data.url}\n"
-                    f"{'-' * 40}\n\n"
-                    f"خلاصه:\n{article_data.summary}\n"
-                    f"{'-' * 40}\n\n"
-                    f"متن کامل مقاله:\n{article_data.full_text or 'متن کامل واکشی نشده است.'}"
-                )
-                self.display_details_text(content)
+                cached_text = self.cache.get_full_text(article_data["pageid"])
+                if cached_text is not None:
+                    self.display_details_text(self.format_article_details(article_data, cached_text))
+                    return
+                self.display_details_text(self.format_article_details(article_data, "در حال بارگیری..."))
+                threading.Thread(
+                    target=self.load_full_text,
+                    args=(selected_item_id, article_data),
+                    daemon=True
+                ).start()
         except IndexError:
             pass  # اگر کلیک خالی بود یا جدول پاک شد
         except Exception as e:
             print(f"Error in on_article_select: {e}")
 
-    def set_status(self, message):
-
-        self.after(0, self.status_var.set, message)
+    @staticmethod
+    def format_article_details(article: dict, full_text: str | None) -> str:
+        return (
+            f"عنوان: {article.get('title')}\n"
+            f"PageID: {article.get('pageid')}\n"
+            f"URL: {article.get('url')}\n"
+            f"{'-' * 40}\n\n"
+            f"خلاصه:\n{article.get('summary')}\n"
+            f"{'-' * 40}\n\n"
+            f"متن کامل مقاله:\n{full_text or 'متن کامل واکشی نشده است.'}"
+        )
 
-    def display_articles_in_tree(self, articles: List[Any]):
+    def load_full_text(self, item_id: str, article: dict):
+        """
+        full_text در لیست نیست؛ فقط برای مقاله انتخاب‌شده از /articles/{pageid} خوانده (در thread جدا)
+        و برای مرور آفلاین در کش محلی ذخیره می‌شود.
+        """
+        try:
+            response = requests.get(f"{self.server_base_url}/articles/{article['pageid']}", timeout=10)
+            response.raise_for_status()
+            full_text = response.json().get("full_text")
+            if full_text is not None:
+                self.cache.set_full_text(article["pageid"], full_text)
+        except requests.RequestException as e:
+            full_text = f"متن کامل این مقاله در کش محلی نیست و سرور در دسترس نیست: {e}"
 
-        def _display():
+        def _show():
+            # اگر کاربر در این فاصله مقاله دیگری را انتخاب کرده باشد نتیجه نمایش داده نمی‌شود
+            if self.tree.selection() and self.tree.selection()[0] == item_id:
+                self.display_details_text(self.format_article_details(article, full_text))
 
-            self.tree.delete(*self.tree.get_children())
-            self.articles_data_map.clear()
+        self.after(0, _show)
 
+    def set_status(self, message):
 
-            for article in articles:
-                values = (article.title, article.summary)
+        self.after(0, self.status_var.set, message)
 
-                item_id = self.tree.insert("", tk.END, values=values)
+    def append_articles_to_tree(self, articles: List[Dict[str, Any]]):
+        """فقط ردیف‌های صفحه جدید اضافه می‌شوند؛ باید روی thread اصلی Tk صدا زده شود."""
+        for article in articles:
+            values = (article.get("title"), article.get("summary"))
 
-                self.articles_data_map[item_id] = article
+            item_id = self.tree.insert("", tk.END, values=values)
 
-        self.after(0, _display)
+            self.articles_data_map[item_id] = article
 
     def display_details_text(self, content: str):
 
@@ -159,22 +206,86 @@ class CrawlerApp(tk.Tk):
 
         self.after(0, _set_state)
 
-    def load_articles_from_db(self):
-
-        self.set_status("در حال بارگیری مقالات از پایگاه داده...")
+    def load_articles(self):
+        """لیست را فوراً از کش محلی نشان می‌دهد و در پس‌زمینه فقط تغییرات را از سرور همگام می‌کند."""
+        self.show_cached_articles()
+        self.start_sync_thread()
+
+    def show_cached_articles(self):
+        self.tree.delete(*self.tree.get_children())
+        self.articles_data_map.clear()
+        self.next_cursor = None
+        self.has_more_articles = True
+        # پاک کردن پنجره جزئیات
+        self.display_details_text("")
+        self.load_next_page()
+
+    def load_next_page(self):
+        """صفحه بعد (keyset روی id) از SQLite محلی؛ چند میلی‌ثانیه و بدون شبکه."""
+        if not self.has_more_articles:
+            return
+        articles = self.cache.page(before_id=self.next_cursor, limit=ARTICLE_PAGE_SIZE)
+        self.append_articles_to_tree(articles)
+        self.has_more_articles = len(articles) == ARTICLE_PAGE_SIZE
+        if articles:
+            self.next_cursor = articles[-1]["id"]
+
+        more = " (برای موارد بیشتر اسکرول کنید)" if self.has_more_articles else ""
+        self.set_status(f"{len(self.articles_data_map)} از {self.cache.count()} مقاله نمایش داده شد{more}.")
+
+        # اگر هنوز جدول پر نشده (اسکرول‌بار فعال نیست) صفحه بعد هم اضافه می‌شود
+        self.tree.update_idletasks()
+        if self.has_more_articles and self.tree.yview()[1] >= LOAD_MORE_SCROLL_THRESHOLD:
+            self.after(0, self.load_next_page)
+
+    def start_sync_thread(self):
+        if self.sync_running:
+            return
+        self.sync_running = True
+        threading.Thread(target=self.sync_with_server, daemon=True).start()
+
+    def sync_with_server(self):
+        """
+        در thread جدا: ردیف‌های تغییرکرده از آخرین همگام‌سازی را از /articles/changes می‌گیرد.
+        on_sync_finished در هر حالت (حتی خطای SQLite) صدا زده می‌شود تا sync_running آزاد شود.
+        """
+        changed = 0
+        error = None
         try:
-            with database.SyncSessionLocal() as db:
-                articles = db.query(database.WikipediaArticle).order_by(database.WikipediaArticle.id.desc()).all()
-
-            # نمایش داده‌ها در جدول
-            self.display_articles_in_tree(articles)
-            # پاک کردن پنجره جزئیات
-            self.display_details_text("")
-
-            self.set_status(f"{len(articles)} مقاله از پایگاه داده بارگیری شد.")
+            since, after_id = self.cache.get_sync_state()
+            if since:
+                since = (datetime.fromisoformat(since) - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+                after_id = 0
+            while True:
+                params = {"limit": SYNC_PAGE_SIZE, "after_id": after_id}
+                if since:
+                    params["since"] = since
+                response = requests.get(f"{self.server_base_url}/articles/changes", params=params, timeout=30)
+                response.raise_for_status()
+                page = response.json()
+                changed += self.cache.upsert_articles(page.get("items", []))
+                since, after_id = page.get("next_since"), page.get("next_after_id") or 0
+                self.cache.set_sync_state(since, after_id)
+                if not page.get("has_more"):
+                    break
         except Exception as e:
-            messagebox.showerror("خطای پایگاه داده", f"خطا در اتصال Sync به DB:\n{e}")
-            self.set_status("خطا در بارگیری.")
+            error = e
+        finally:
+            self.after(0, self.on_sync_finished, changed, error)
+
+    def on_sync_finished(self, changed: int, error: Exception | None):
+        self.sync_running = False
+        if isinstance(error, requests.RequestException):
+            print(f"Sync failed, browsing offline from local cache: {error}")
+            self.set_status(f"سرور در دسترس نیست؛ {self.cache.count()} مقاله از کش محلی (حالت آفلاین).")
+            return
+        if error is not None:
+            print(f"Sync failed: {error}")
+            self.set_status(f"خطا در همگام‌سازی کش محلی: {error}")
+            return
+        if changed:
+            self.show_cached_articles()
+        self.set_status(f"همگام‌سازی انجام شد ({changed} مقاله جدید/تغییرکرده)؛ {self.cache.count()} مقاله در کش محلی.")
 
     # --- بخش مدیریت Job (ارتباط Async با سرور FastAPI) ---
 
@@ -213,22 +324,16 @@ class CrawlerApp(tk.Tk):
 
             self.set_status(f"درخواست با ID: {job_id} ارسال شد. در حال رصد وضعیت...")
 
-            start_time = time.time()
-            while time.time() - start_time < 300:  # 5 دقیقه مهلت
-                status, result = self.check_job_status(job_id)
-
-                if status == "complete":
-                    self.set_status(f"درخواست {job_id} با موفقیت تمام شد.")
-                    self.handle_job_success(result)
-                    return
-
-                elif status == "failed":
-                    self.set_status(f"درخواست {job_id} شکست خورد.")
-                    self.handle_job_failure(result)
+            deadline = time.time() + 300  # 5 دقیقه مهلت
+            try:
+                if self.wait_for_job_events(job_id, deadline):
                     return
+            except requests.RequestException as e:
+                print(f"SSE unavailable, falling back to polling: {e}")
 
-                self.set_status(f"درخواست {job_id} در حال اجرا... (وضعیت: {status})")
-                time.sleep(3)
+            # اگر SSE در دسترس نبود یا زودتر قطع شد، تا پایان مهلت به polling برمی‌گردیم
+            if self.poll_job_status(job_id, deadline):
+                return
 
             self.set_status(f"درخواست {job_id} زمان‌بر شد (Timeout).")
             self.after(0, messagebox.showwarning, "پایان مهلت", "پاسخی از سرور دریافت نشد.")
@@ -239,6 +344,55 @@ class CrawlerApp(tk.Tk):
         finally:
             self.set_buttons_state(tk.NORMAL)
 
+    def handle_job_update(self, job_id: str, status: str, result: dict | None) -> bool:
+        """یک وضعیت دریافتی را نمایش می‌دهد؛ اگر job تمام شده باشد True برمی‌گرداند."""
+        if status == "complete":
+            self.set_status(f"درخواست {job_id} با موفقیت تمام شد.")
+            self.handle_job_success(result or {})
+            return True
+
+        elif status in ("failed", "not_found"):
+            self.set_status(f"درخواست {job_id} شکست خورد.")
+            self.handle_job_failure(result or {})
+            return True
+
+        if result:
+            self.set_status(
+                f"درخواست {job_id} در حال اجرا... "
+                f"(دسته‌ها: {result.get('batches_done', 0)}/{result.get('batches_total', 0)}، "
+                f"یافت‌شده: {result.get('found', 0)}، ذخیره‌شده: {result.get('saved', 0)})"
+            )
+        else:
+            self.set_status(f"درخواست {job_id} در حال اجرا... (وضعیت: {status})")
+        return False
+
+    def wait_for_job_events(self, job_id: str, deadline: float) -> bool:
+        """به جریان SSE سرور گوش می‌دهد؛ سرور هر 15 ثانیه keep-alive می‌فرستد."""
+        with requests.get(
+                f"{self.server_base_url}/jobs/events/{job_id}",
+                stream=True,
+                timeout=(10, 30)
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if time.time() > deadline:
+                    return False
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):])
+                if self.handle_job_update(job_id, event.get("status"), event.get("result")):
+                    return True
+        return False
+
+    def poll_job_status(self, job_id: str, deadline: float) -> bool:
+
+        while time.time() < deadline:
+            status, result = self.check_job_status(job_id)
+            if self.handle_job_update(job_id, status, result):
+                return True
+            time.sleep(3)
+        return False
+
     def submit_job(self, task_details: dict) -> str | None:
 
         try:
@@ -279,7 +433,7 @@ class CrawlerApp(tk.Tk):
         self.after(0, messagebox.showinfo, "درخواست موفق", message)
 
 
-        self.after(0, self.load_articles_from_db)
+        self.after(0, self.load_articles)
 
     def handle_job_failure(self, result: dict):
 
@@ -290,15 +444,13 @@ class CrawlerApp(tk.Tk):
 
 if __name__ == "__main__":
     print("Starting client (v5.0 - Wikipedia Only)...")
-    print("بررسی و ساخت جداول (Sync method)...")
+    # کلاینت دیگر به PostgreSQL وصل نمی‌شود؛ همه داده‌ها از API سرور و کش محلی SQLite می‌آیند
     try:
 
-        database.create_db_and_tables_sync()
-
         app = CrawlerApp()
         app.mainloop()
 
     except Exception as e:
-        print(f"خطای بحرانی: امکان اتصال به پایگاه داده PostgreSQL وجود ندارد.")
+        print(f"خطای بحرانی: امکان اجرای کلاینت وجود ندارد.")
         print(f"Error: {e}")
-        print("لطفا از روشن بودن سرویس PostgreSQL و صحت اطلاعات .env اطمینان حاصل کنید.")
\ No newline at end of file
+        print("لطفا مسیر کش محلی (CLIENT_CACHE_PATH) را بررسی کنید.")
\ No newline at end of file
@@ -1,38 +1,159 @@
 import asyncio
+import hashlib
 import json
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Executor
+from urllib.parse import urlsplit
+
 import httpx
-from bs4 import BeautifulSoup
+from sqlalchemy import and_, column, func, or_, select, table, text
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .frontier import BloomFilter, Frontier
+from .http_cache import ResponseCache
+from .metrics import (
+    DB_SAVE_ROWS, DB_SAVE_SECONDS, ERRORS, HTTP_FETCH_SECONDS, PARSE_SECONDS, RETRIES, SLOT_WAIT_SECONDS
+)
+from .parsing import (
+    PARSE_ERRORS, loads, parse_details_response, parse_pages_response, parse_search_response
+)
+from .ratelimit import RateLimiterRegistry, backoff_delay, parse_retry_after
+
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+
+def create_http_client(max_connections: int = 20, max_keepalive_connections: int = 10,
+                       keepalive_expiry: float = 30.0, timeout: float = 10.0) -> httpx.AsyncClient:
+    """یک کلاینت HTTP/2 با connection pool قابل تنظیم می‌سازد (قابل اشتراک بین چند کراولر)."""
+    return httpx.AsyncClient(
+        headers={"User-Agent": DEFAULT_USER_AGENT},
+        http2=True,
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+    )
+
 
 class BaseCrawler:
 
 
-    def __init__(self, base_url: str, concurrency_limit: int = 5):
+    RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+    # پاسخ‌های بزرگ‌تر از این (کاراکتر) بیرون از event loop پارس می‌شوند
+    PARSE_OFFLOAD_THRESHOLD = 256 * 1024
+
+    def __init__(self, base_url: str, concurrency_limit: int = 5, cache: ResponseCache | None = None,
+                 client: httpx.AsyncClient | None = None, rate_limiters: RateLimiterRegistry | None = None,
+                 max_retries: int = 4, parse_executor: Executor | None = None,
+                 parse_offload_threshold: int = PARSE_OFFLOAD_THRESHOLD):
         self.base_url = base_url
-        self.client = httpx.AsyncClient(
-            base_url=self.base_url,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            },
-            http2=True,
-            timeout=10.0
-        )
+        self.cache = cache
+        self.max_retries = max_retries
+        # None یعنی thread pool پیش‌فرض event loop
+        self.parse_executor = parse_executor
+        self.parse_offload_threshold = parse_offload_threshold
+        self.rate_limiter = (rate_limiters or RateLimiterRegistry()).get(urlsplit(base_url).netloc)
+        # کلاینت تزریق‌شده متعلق به فراخواننده است و در close بسته نمی‌شود
+        self.owns_client = client is None
+        self.client = client or create_http_client(max_connections=concurrency_limit * 2)
+        self.concurrency_limit = concurrency_limit
         self.semaphore = asyncio.Semaphore(concurrency_limit)
         print(f"Async Crawler for {base_url} initialized (Concurrency: {concurrency_limit}).")
 
     async def fetch_page(self, url_path: str = "", params: dict = None) -> str | None:
-        async with self.semaphore:
-            try:
-                print(f"Fetching {url_path} with params {params}...")
-                response = await self.client.get(url_path, params=params)
-                response.raise_for_status()
-                return response.text
-            except httpx.RequestError as e:
-                print(f"HTTP Error fetching {e.request.url!r}: {e}")
+        cache_key = None
+        cached = None
+        if self.cache:
+            cache_key = self.cache.make_key(f"{self.base_url}{url_path}", params)
+            cached = await self.cache.get(cache_key)
+            if cached and self.cache.is_fresh(cached):
+                print(f"Cache hit for {url_path} with params {params}.")
+                return cached["body"]
+
+        url = f"{self.base_url}{url_path}"
+        headers = ResponseCache.conditional_headers(cached) if ResponseCache.has_validators(cached) else None
+        endpoint = self.metrics_endpoint(url_path, params)
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            waited = time.perf_counter()
+            async with self.semaphore:
+                SLOT_WAIT_SECONDS.labels("semaphore").observe(time.perf_counter() - waited)
+                waited = time.perf_counter()
+                async with self.rate_limiter.slot():
+                    SLOT_WAIT_SECONDS.labels("rate_limiter").observe(time.perf_counter() - waited)
+                    started = time.perf_counter()
+                    try:
+                        print(f"Fetching {url_path} with params {params}...")
+                        response = await self.client.get(url, params=params, headers=headers)
+                    except httpx.RequestError as e:
+                        print(f"HTTP Error fetching {e.request.url!r}: {e}")
+                    status = str(response.status_code) if response is not None else "error"
+                    HTTP_FETCH_SECONDS.labels(endpoint, status).observe(time.perf_counter() - started)
+
+            if response is None:
+                self.rate_limiter.record_error()
+                ERRORS.labels("http", "request_error").inc()
+                reason = "request_error"
+                delay = backoff_delay(attempt)
+
+            elif response.status_code == 304 and cached:
+                self.rate_limiter.record_success()
+                await self.cache.refresh(cache_key, cached)
+                return cached["body"]
+
+            elif response.status_code == 429 or self.is_throttled(response):
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                self.rate_limiter.record_throttle(retry_after)
+                reason = "throttled"
+                delay = retry_after if retry_after is not None else backoff_delay(attempt)
+
+            elif response.status_code in self.RETRYABLE_STATUS_CODES:
+                self.rate_limiter.record_error()
+                ERRORS.labels("http", str(response.status_code)).inc()
+                reason = str(response.status_code)
+                delay = parse_retry_after(response.headers.get("retry-after")) or backoff_delay(attempt)
+
+            elif response.is_error:
+                print(f"HTTP {response.status_code} fetching {response.url!r}; not retrying.")
+                ERRORS.labels("http", str(response.status_code)).inc()
                 return None
 
+            else:
+                self.rate_limiter.record_success()
+                if self.cache:
+                    await self.cache.set(cache_key, ResponseCache.build_entry(response.text, response.headers))
+                return response.text
+
+            if attempt < self.max_retries:
+                print(f"Retrying {url_path} in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+                RETRIES.labels(endpoint, reason).inc()
+                await asyncio.sleep(delay)
+
+        print(f"Giving up on {url_path} after {self.max_retries + 1} attempts.")
+        ERRORS.labels("http", "gave_up").inc()
+        return None
+
+    def metrics_endpoint(self, url_path: str, params: dict | None) -> str:
+        """برچسب endpoint در متریک‌ها؛ باید کم‌تنوع بماند (بدون مقادیر پارامترها)."""
+        return url_path or "/"
+
+    async def parse_payload(self, parser, content: str):
+        """پاسخ‌های کوچک درجا و پاسخ‌های بزرگ در parse_executor پارس می‌شوند تا event loop مسدود نشود."""
+        if len(content) < self.parse_offload_threshold:
+            return parser(content)
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, parser, content)
+
+    def is_throttled(self, response: httpx.Response) -> bool:
+        """زیرکلاس‌ها می‌توانند خطاهای throttle درون بدنه پاسخ (مثل maxlag) را تشخیص دهند."""
+        return False
+
     async def parse(self, content: str) -> list:
         raise NotImplementedError("Subclass must implement abstract method parse")
 
@@ -43,149 +164,538 @@ class BaseCrawler:
         return []
 
     async def close(self):
-        await self.client.aclose()
+        if self.owns_client:
+            await self.client.aclose()
 
 
 
 class WikipediaCrawler(BaseCrawler):
 
-    def __init__(self, search_term: str):
+    API_PATH = "/w/api.php"
+    # سقف srlimit برای کاربران عادی API
+    SEARCH_PAGE_LIMIT = 50
+    # TextExtracts بدون exintro در هر پاسخ فقط یک متن کامل برمی‌گرداند (بقیه با excontinue)،
+    # پس هر درخواست جزئیات یک صفحه دارد تا صفحات زیر semaphore هم‌زمان واکشی شوند
+    DETAILS_BATCH_SIZE = 1
+    # صفحات کامل‌شده در گروه‌های این اندازه برگردانده و ذخیره می‌شوند (و اندازه هر shard توزیع‌شده است)
+    DETAILS_GROUP_SIZE = 20
+    MAX_RESULTS_LIMIT = 1000
+    # https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
+    MAXLAG = 5
+    # گسترش گراف پیوندها: حداکثر pageid در هر درخواست links/linkshere و سقف صفحات continue
+    LINKS_BATCH_SIZE = 50
+    LINKS_MAX_CONTINUATIONS = 5
+    MAX_EXPAND_DEPTH = 3
+    MAX_PAGES_LIMIT = 5000
+    LINK_DIRECTIONS = {
+        "links": {"generator": "links", "gplnamespace": 0, "gpllimit": "max"},
+        "linkshere": {"generator": "linkshere", "glhnamespace": 0, "glhlimit": "max"},
+    }
+
+    DEFAULT_BASE_URL = "https://en.wikipedia.org"
+
+    def __init__(self, search_term: str = "", max_results: int = 20, cache: ResponseCache | None = None,
+                 client: httpx.AsyncClient | None = None, rate_limiters: RateLimiterRegistry | None = None,
+                 expand_depth: int = 0, max_pages: int | None = None, link_direction: str = "links",
+                 base_url: str = DEFAULT_BASE_URL, concurrency_limit: int = 5,
+                 parse_executor: Executor | None = None,
+                 parse_offload_threshold: int = BaseCrawler.PARSE_OFFLOAD_THRESHOLD,
+                 known_pages_filter=None):
         self.search_term = search_term
-        super().__init__(base_url="https://en.wikipedia.org", concurrency_limit=5)
+        self.max_results = max(1, min(int(max_results), self.MAX_RESULTS_LIMIT))
+        self.expand_depth = max(0, min(int(expand_depth), self.MAX_EXPAND_DEPTH))
+        self.max_pages = max(self.max_results, min(int(max_pages or self.max_results * 5), self.MAX_PAGES_LIMIT))
+        if link_direction not in self.LINK_DIRECTIONS:
+            raise ValueError(f"link_direction نامعتبر: {link_direction} (مجاز: links, linkshere)")
+        self.link_direction = link_direction
+        # تابع async که از میان آیتم‌ها pageid صفحاتی را برمی‌گرداند که ذخیره‌شده و به‌روز هستند
+        self.known_pages_filter = known_pages_filter
+        self.batches_total = 0
+        self.pages_skipped = 0
+        super().__init__(
+            base_url=base_url,
+            concurrency_limit=concurrency_limit,
+            cache=cache,
+            client=client,
+            rate_limiters=rate_limiters,
+            parse_executor=parse_executor,
+            parse_offload_threshold=parse_offload_threshold
+        )
 
-    async def run(self) -> list:
+    async def fetch_page(self, url_path: str = "", params: dict = None) -> str | None:
+        if url_path == self.API_PATH and params is not None:
+            params = {**params, "maxlag": self.MAXLAG}
+        return await super().fetch_page(url_path, params)
+
+    def metrics_endpoint(self, url_path: str, params: dict | None) -> str:
+        if url_path == self.API_PATH and params:
+            return f"{url_path}:{params.get('list') or params.get('generator') or params.get('prop', 'query')}"
+        return super().metrics_endpoint(url_path, params)
+
+    def is_throttled(self, response: httpx.Response) -> bool:
+        if response.status_code != 200 or b'"maxlag"' not in response.content[:512]:
+            return False
+        try:
+            return loads(response.content).get("error", {}).get("code") == "maxlag"
+        except PARSE_ERRORS:
+            return False
 
-        api_path = "/w/api.php"
+    async def run(self) -> list:
 
-        search_params = {
-            "action": "query",
-            "format": "json",
-            "list": "search",
-            "srsearch": self.search_term,
-            "srlimit": 20
-        }
-        search_json_content = await self.fetch_page(url_path=api_path, params=search_params)
-        if not search_json_content:
-            return []
+        final_articles = []
+        async for batch in self.iter_batches():
+            final_articles.extend(batch)
+        return final_articles
 
-        search_results = await self.parse_search_results(search_json_content)
+    async def iter_batches(self):
+        """
+        مقالات کامل را دسته به دسته (به ترتیب اتمام) برمی‌گرداند تا فراخواننده بتواند
+        هم‌زمان ذخیره کند. اگر expand_depth > 0 باشد پس از نتایج جستجو، گراف پیوندها
+        به صورت BFS تا سقف max_pages پیمایش می‌شود.
+        """
+        self.batches_total = 0
+        self.pages_skipped = 0
+        search_results = await self.search()
         if not search_results:
-            return []
-
-
-        page_ids = [item["pageid"] for item in search_results if "pageid" in item]
-        if not page_ids:
-            return search_results
-
-        details_json_content = await self.fetch_article_details(page_ids)
-        if not details_json_content:
-            return search_results
-
-        details_map = await self.parse_article_details(details_json_content)
-
+            return
+
+        # گسترش از همه نتایج انجام می‌شود، حتی صفحاتی که جزئیاتشان دوباره واکشی نمی‌شود
+        seed_ids = [item["pageid"] for item in search_results]
+        pending = await self.drop_known_pages(search_results)
+        async for batch in self.iter_detail_batches({item["pageid"]: item for item in pending}):
+            yield batch
+
+        if self.expand_depth:
+            async for batch in self.iter_expansion(seed_ids):
+                yield batch
+
+    async def drop_known_pages(self, items: list[dict]) -> list[dict]:
+        """صفحاتی که known_pages_filter تازه می‌داند حذف می‌شوند تا متن کاملشان دوباره دانلود نشود."""
+        if not self.known_pages_filter or not items:
+            return items
+        known = await self.known_pages_filter(items)
+        if not known:
+            return items
+        self.pages_skipped += len(known)
+        print(f"Skipping {len(known)} of {len(items)} pages already stored and up to date.")
+        return [item for item in items if item["pageid"] not in known]
+
+    async def iter_detail_batches(self, items_by_id: dict):
+        """
+        جزئیات را در گروه‌های DETAILS_GROUP_SIZE صفحه‌ای کامل می‌کند (حداکثر concurrency_limit گروه
+        در حال واکشی؛ درخواست‌های هر گروه خودشان زیر semaphore هم‌زمان اجرا می‌شوند).
+        """
+        page_ids = list(items_by_id)
+        batches = iter([
+            page_ids[i:i + self.DETAILS_GROUP_SIZE]
+            for i in range(0, len(page_ids), self.DETAILS_GROUP_SIZE)
+        ])
+        self.batches_total += -(-len(page_ids) // self.DETAILS_GROUP_SIZE)
+
+        pending = set()
+
+        def schedule_next():
+            batch = next(batches, None)
+            if batch is not None:
+                pending.add(asyncio.create_task(self.complete_batch(batch, items_by_id)))
+
+        for _ in range(self.concurrency_limit):
+            schedule_next()
 
-        final_articles = []
-        for item in search_results:
-            page_id = item["pageid"]
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    schedule_next()
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_expansion(self, seed_ids: list[int]):
+        """مقالات کامل هر سطح گسترش پیوندها را دسته به دسته برمی‌گرداند."""
+        async for _, pending in self.iter_expansion_levels(seed_ids):
+            async for batch in self.iter_detail_batches({item["pageid"]: item for item in pending}):
+                yield batch
+
+    async def iter_expansion_levels(self, seed_ids: list[int]):
+        """
+        پیمایش سطح به سطح پیوندها با frontier اولویت‌دار و visited-set از نوع Bloom filter.
+        برای هر سطح (depth، آیتم‌های بدون جزئیات) را برمی‌گرداند؛ صفحات تازه ذخیره‌شده حذف شده‌اند.
+        فراخواننده جزئیات را خودش کامل می‌کند (درجا یا با تقسیم بین ورکرها).
+        """
+        # فقط seedها و صفحات زمان‌بندی‌شده وارد visited می‌شوند، پس حداکثر max_pages عضو دارد
+        visited = BloomFilter(capacity=self.max_pages)
+        for page_id in seed_ids:
+            visited.add(page_id)
+        frontier = Frontier(visited)
+        budget = self.max_pages - len(seed_ids)
+        current_level = seed_ids
+
+        for depth in range(1, self.expand_depth + 1):
+            if budget <= 0 or not current_level:
+                break
+
+            link_batches = await asyncio.gather(*(
+                self.fetch_links(current_level[i:i + self.LINKS_BATCH_SIZE])
+                for i in range(0, len(current_level), self.LINKS_BATCH_SIZE)
+            ))
+            counts = Counter()
+            titles = {}
+            for links in link_batches:
+                for page_id, title in links.items():
+                    counts[page_id] += 1
+                    titles[page_id] = title
+            for page_id, score in counts.most_common():
+                frontier.push(page_id, depth, score)
+
+            next_level = [page_id for page_id, _ in frontier.pop_batch(budget)]
+            budget -= len(next_level)
+            print(f"Expanding depth {depth}: {len(next_level)} pages (budget left: {budget}).")
+
+            pending = await self.drop_known_pages(
+                [{"pageid": page_id, "title": titles.get(page_id)} for page_id in next_level]
+            )
+            yield depth, pending
+            current_level = next_level
+
+    async def fetch_links(self, page_ids: list[int]) -> dict[int, str]:
+        """صفحات مقصد (links) یا مبدأ (linkshere) یک دسته را به صورت {pageid: title} برمی‌گرداند."""
+        links = {}
+        continue_params = {}
+        for _ in range(self.LINKS_MAX_CONTINUATIONS):
+            params = {
+                "action": "query",
+                "format": "json",
+                "pageids": "|".join(map(str, page_ids)),
+                **self.LINK_DIRECTIONS[self.link_direction],
+                **continue_params,
+            }
+            content = await self.fetch_page(url_path=self.API_PATH, params=params)
+            if not content:
+                break
+            try:
+                with PARSE_SECONDS.labels("links").time():
+                    pages, continue_params = await self.parse_payload(parse_pages_response, content)
+            except PARSE_ERRORS:
+                ERRORS.labels("parse", "links").inc()
+                break
+            for page_id_str, page_data in pages.items():
+                page_id = int(page_id_str)
+                if page_id > 0 and "missing" not in page_data and page_data.get("ns", 0) == 0:
+                    links[page_id] = page_data.get("title")
+
+            if not continue_params:
+                break
+        return links
+
+    @staticmethod
+    def summary_from_extract(full_text: str | None, max_length: int = 500) -> str:
+        if not full_text:
+            return ""
+        first_paragraph = full_text.strip().split("\n", 1)[0]
+        return first_paragraph[:max_length]
+
+    async def complete_batch(self, page_ids: list[int], items_by_id: dict) -> list[dict]:
+        """یک گروه را کامل می‌کند؛ درخواست‌های DETAILS_BATCH_SIZE صفحه‌ای آن هم‌زمان اجرا می‌شوند."""
+        details_map = {}
+        for batch_map in await asyncio.gather(*(
+            self.fetch_details_map(page_ids[i:i + self.DETAILS_BATCH_SIZE])
+            for i in range(0, len(page_ids), self.DETAILS_BATCH_SIZE)
+        )):
+            details_map.update(batch_map)
+        articles = []
+        for page_id in page_ids:
+            item = items_by_id.pop(page_id)
             if page_id in details_map:
                 item.update(details_map[page_id])
-            final_articles.append(item)
-
-        return final_articles
-
-    async def parse_search_results(self, json_content: str) -> list[dict]:
-
+            # صفحات گسترش پیوندها اسنیپت جستجو ندارند
+            item.setdefault("summary", self.summary_from_extract(item.get("full_text")))
+            articles.append(item)
+        return articles
+
+    async def search(self) -> list[dict]:
+        """نتایج جستجو را با دنبال کردن sroffset/continue تا max_results جمع می‌کند."""
+        results = []
+        seen_ids = set()
+        continue_params = {}
+
+        while len(results) < self.max_results:
+            search_params = {
+                "action": "query",
+                "format": "json",
+                "list": "search",
+                "srsearch": self.search_term,
+                # timestamp (آخرین ویرایش) برای تشخیص صفحات ذخیره‌شده‌ای که کهنه شده‌اند
+                "srprop": "snippet|timestamp",
+                "srlimit": min(self.SEARCH_PAGE_LIMIT, self.max_results - len(results)),
+                **continue_params,
+            }
+            search_json_content = await self.fetch_page(url_path=self.API_PATH, params=search_params)
+            if not search_json_content:
+                break
+
+            articles, continue_params = await self.parse_search_results(search_json_content)
+            for item in articles:
+                if item["pageid"] not in seen_ids:
+                    seen_ids.add(item["pageid"])
+                    results.append(item)
+
+            if not continue_params:
+                break
+
+        return results[:self.max_results]
+
+    async def fetch_details_map(self, page_ids: list[int]) -> dict:
+        """
+        جزئیات یک دسته را می‌گیرد و excontinue را دنبال می‌کند؛ TextExtracts در هر پاسخ
+        فقط برای بخشی از صفحات متن کامل برمی‌گرداند.
+        """
+        details_map = {}
+        continue_params = {}
+        while True:
+            details_json_content = await self.fetch_article_details(page_ids, continue_params)
+            if not details_json_content:
+                break
+
+            parsed_details, continue_params = await self.parse_article_details(details_json_content)
+            for page_id, details in parsed_details.items():
+                current = details_map.setdefault(page_id, {})
+                for key, value in details.items():
+                    if value is not None:
+                        current[key] = value
+                    else:
+                        current.setdefault(key, None)
+
+            if not continue_params:
+                break
+
+        return details_map
+
+    async def parse_search_results(self, json_content: str) -> tuple[list[dict], dict]:
+        """نتایج جستجو و پارامترهای continue."""
         print(f"Parsing Wikipedia JSON API for '{self.search_term}'...")
+        started = time.perf_counter()
         try:
-            data = json.loads(json_content)
-            articles = []
-            search_results = data.get("query", {}).get("search", [])
-
-            for item in search_results:
-                title = item.get("title")
-                snippet_html = item.get("snippet")
-                pageid = item.get("pageid")
-
-                cleaned_summary = BeautifulSoup(snippet_html, "html.parser").get_text(strip=True)
-
-                if title and cleaned_summary and pageid:
-                    articles.append({
-                        "pageid": pageid,
-                        "title": title,
-                        "summary": cleaned_summary,
-                    })
+            articles, continue_params = await self.parse_payload(parse_search_response, json_content)
+            PARSE_SECONDS.labels("search").observe(time.perf_counter() - started)
             print(f"Found {len(articles)} Wikipedia articles from search.")
-            return articles
-        except (json.JSONDecodeError, AttributeError):
+            return articles, continue_params
+        except PARSE_ERRORS:
             print("Error: Failed to decode or parse Wikipedia search response.")
-            return []
+            ERRORS.labels("parse", "search").inc()
+            return [], {}
 
-    async def fetch_article_details(self, page_ids: list[int]) -> str | None:
+    async def fetch_article_details(self, page_ids: list[int], continue_params: dict = None) -> str | None:
 
         print(f"Fetching full details for {len(page_ids)} page IDs...")
-        api_path = "/w/api.php"
+        # exintro عمداً ارسال نمی‌شود: MediaWiki هر مقداری (حتی false) را true در نظر می‌گیرد
         details_params = {
             "action": "query",
             "format": "json",
             "pageids": "|".join(map(str, page_ids)),
             "prop": "extracts|info",
             "inprop": "url",
-            "exintro": False,
-            "explaintext": True,
+            "explaintext": 1,
+            "exlimit": "max",
+            **(continue_params or {}),
         }
-        return await self.fetch_page(url_path=api_path, params=details_params)
-
-    async def parse_article_details(self, json_content: str) -> dict:
-
-        details_map = {}
+        return await self.fetch_page(url_path=self.API_PATH, params=details_params)
+
+    async def fetch_revisions(self, page_ids: list[int]) -> dict[int, int]:
+        """
+        شماره آخرین revision صفحات را با prop=info (بدون متن) می‌گیرد؛ دسته‌های
+        50تایی هم‌زمان اجرا می‌شوند. صفحات حذف‌شده در خروجی نیستند.
+        """
+        async def fetch_batch(batch: list[int]) -> dict[int, int]:
+            params = {
+                "action": "query",
+                "format": "json",
+                "pageids": "|".join(map(str, batch)),
+                "prop": "info",
+            }
+            content = await self.fetch_page(url_path=self.API_PATH, params=params)
+            if not content:
+                return {}
+            try:
+                with PARSE_SECONDS.labels("revisions").time():
+                    pages, _ = await self.parse_payload(parse_pages_response, content)
+            except PARSE_ERRORS:
+                ERRORS.labels("parse", "revisions").inc()
+                return {}
+            return {
+                int(page_id_str): page_data["lastrevid"]
+                for page_id_str, page_data in pages.items()
+                if "missing" not in page_data and "lastrevid" in page_data
+            }
+
+        revisions = {}
+        batch_maps = await asyncio.gather(*(
+            fetch_batch(page_ids[i:i + self.LINKS_BATCH_SIZE])
+            for i in range(0, len(page_ids), self.LINKS_BATCH_SIZE)
+        ))
+        for batch_map in batch_maps:
+            revisions.update(batch_map)
+        return revisions
+
+    async def parse_article_details(self, json_content: str) -> tuple[dict, dict]:
+        """جزئیات صفحات ({pageid: ...}) و پارامترهای continue."""
+        started = time.perf_counter()
         try:
-            data = json.loads(json_content)
-            pages = data.get("query", {}).get("pages", {})
-
-            for page_id_str, page_data in pages.items():
-                page_id = int(page_id_str)
-                details_map[page_id] = {
-                    "full_text": page_data.get("extract"),
-                    "url": page_data.get("fullurl")
-                }
+            details_map, continue_params = await self.parse_payload(parse_details_response, json_content)
+            PARSE_SECONDS.labels("details").observe(time.perf_counter() - started)
             print(f"Parsed full details for {len(details_map)} articles.")
-            return details_map
-        except (json.JSONDecodeError, AttributeError):
+            return details_map, continue_params
+        except PARSE_ERRORS:
             print("Error: Failed to decode or parse Wikipedia details response.")
-            return {}
+            ERRORS.labels("parse", "details").inc()
+            return {}, {}
 
 
 class DataSaverAsync:
 
-    def __init__(self, db_session: AsyncSession):
-        self.db = db_session
+    # سقف پارامترهای bind در یک کوئری PostgreSQL (asyncpg)
+    MAX_QUERY_PARAMS = 32767
 
-    async def save_items(self, items: list[dict], model_class):
-        """آیتم‌ها را در دیتابیس ذخیره می‌کند و از درج تکراری جلوگیری می‌کند."""
+    def __init__(self, db_session: AsyncSession, chunk_size: int = 1000, copy_threshold: int = 5000):
+        self.db = db_session
+        self.chunk_size = chunk_size
+        self.copy_threshold = copy_threshold
+        # save_items خطای دیتابیس را نگه نمی‌دارد و 0 برمی‌گرداند؛ فراخواننده با این شمارنده شکست را تشخیص می‌دهد
+        self.failed_saves = 0
+
+    async def save_items(self, items: list[dict], model_class, mode: str = "ignore"):
+        """
+        آیتم‌ها را در دیتابیس ذخیره می‌کند.
+        mode="ignore": ردیف‌های تکراری نادیده گرفته می‌شوند.
+        mode="update": ردیف‌های موجود فقط وقتی content_hash یا ستون‌های نسخه (__version_fields__) تغییر کرده بازنویسی می‌شوند.
+        خروجی: تعداد ردیف‌های درج‌شده یا به‌روزشده.
+        """
         if not items:
             return 0
 
         constraint_column = getattr(model_class, '__unique_constraint_column__', None)
         if not constraint_column:
             raise TypeError(f"Model {model_class.__name__} does not have __unique_constraint_column__ defined.")
+        if mode not in ("ignore", "update"):
+            raise ValueError(f"Unknown save mode: {mode}")
 
-        # ساخت کوئری INSERT
-        stmt = insert(model_class).values(items)
-
-        stmt = stmt.on_conflict_do_nothing(
-            index_elements=[constraint_column]
-        ).returning(model_class.id)
+        rows = self.prepare_rows(items, model_class, constraint_column)
+        table_name = model_class.__tablename__
+        method = "insert"
+        started = time.perf_counter()
 
         try:
-            result = await self.db.execute(stmt)
-            inserted_rows = result.scalars().all()
+            connection = await self.db.connection()
+            if len(rows) >= self.copy_threshold and connection.dialect.driver == "asyncpg":
+                method = "copy"
+                count = await self._save_with_copy(rows, model_class, constraint_column, mode)
+            else:
+                count = 0
+                for chunk in self._chunks(rows):
+                    stmt = self._build_upsert(insert(model_class).values(chunk), model_class, constraint_column, mode)
+                    result = await self.db.execute(stmt)
+                    count += len(result.scalars().all())
             await self.db.commit()
-            count = len(inserted_rows)
+            DB_SAVE_SECONDS.labels(table_name, method).observe(time.perf_counter() - started)
+            DB_SAVE_ROWS.labels(table_name, method).observe(count)
 
-            print(f"Successfully saved {count} new items to {model_class.__tablename__}.")
+            print(f"Successfully saved {count} new/changed items to {model_class.__tablename__} (mode: {mode}).")
             return count
 
         except Exception as e:
             await self.db.rollback()
+            self.failed_saves += 1
             print(f"Error saving to DB: {e}")
-            return 0
\ No newline at end of file
+            ERRORS.labels("db", type(e).__name__).inc()
+            return 0
+
+    @staticmethod
+    def compute_content_hash(row: dict, fields: tuple) -> str:
+        payload = json.dumps([row.get(field) for field in fields], ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def prepare_rows(self, items: list[dict], model_class, constraint_column: str) -> list[dict]:
+        """
+        ستون‌های ناشناخته را حذف، کلیدها را یکسان، تکراری‌ها را ادغام و content_hash را محاسبه می‌کند.
+        hash فقط برای ردیف‌هایی ساخته می‌شود که همه فیلدهای hash را دارند (مثلا جزئیاتشان واکشی شده)؛
+        در غیر این صورت NULL است و hash ذخیره‌شده دست نمی‌خورد.
+        """
+        table_columns = set(model_class.__table__.columns.keys())
+        hash_fields = getattr(model_class, '__content_hash_fields__', ())
+        use_hash = bool(hash_fields) and "content_hash" in table_columns
+
+        keys = {key for item in items for key in item if key in table_columns}
+        if use_hash:
+            keys.add("content_hash")
+        keys = sorted(keys)
+
+        unique_rows = {}
+        for item in items:
+            row = {key: item.get(key) for key in keys}
+            if use_hash:
+                complete = all(item.get(field) is not None for field in hash_fields)
+                row["content_hash"] = self.compute_content_hash(item, hash_fields) if complete else None
+            unique_rows[row[constraint_column]] = row
+        return list(unique_rows.values())
+
+    def _chunks(self, rows: list[dict]):
+        columns_per_row = max(1, len(rows[0]))
+        size = max(1, min(self.chunk_size, self.MAX_QUERY_PARAMS // columns_per_row))
+        for i in range(0, len(rows), size):
+            yield rows[i:i + size]
+
+    @staticmethod
+    def _build_upsert(stmt, model_class, constraint_column: str, mode: str):
+        if mode == "ignore":
+            return stmt.on_conflict_do_nothing(index_elements=[constraint_column]).returning(model_class.id)
+
+        table = model_class.__table__
+        excluded = stmt.excluded
+        # همه ستون‌های قابل نوشتن بازنویسی می‌شوند، اما مقدار NULL (مثلا جزئیاتی که واکشی نشده)
+        # مقدار موجود را پاک نمی‌کند
+        update_set = {
+            col.name: func.coalesce(excluded[col.name], col)
+            for col in table.columns
+            if not col.primary_key and col.computed is None and col.name not in (constraint_column, "content_hash")
+        }
+        update_set["content_hash"] = func.coalesce(excluded.content_hash, table.c.content_hash)
+        if "updated_at" in table.c:
+            update_set["updated_at"] = func.now()
+        # به‌روزرسانی فقط وقتی محتوا (hash) یا نسخه (مثل lastrevid) تغییر کرده باشد؛
+        # ردیف بدون hash (جزئیات ناقص) به تنهایی باعث به‌روزرسانی نمی‌شود
+        changed = [and_(
+            excluded.content_hash.is_not(None), table.c.content_hash.is_distinct_from(excluded.content_hash)
+        )]
+        for name in getattr(model_class, '__version_fields__', ()):
+            changed.append(and_(excluded[name].is_not(None), table.c[name].is_distinct_from(excluded[name])))
+        return stmt.on_conflict_do_update(
+            index_elements=[constraint_column],
+            set_=update_set,
+            where=or_(*changed)
+        ).returning(model_class.id)
+
+    async def _save_with_copy(self, rows: list[dict], model_class, constraint_column: str, mode: str) -> int:
+        """مسیر سریع برای دسته‌های بزرگ: COPY به جدول موقت و سپس یک INSERT ... SELECT با ON CONFLICT."""
+        table_name = model_class.__tablename__
+        stage_name = f"_stage_{table_name}_{uuid.uuid4().hex[:8]}"
+        columns = list(rows[0].keys())
+        column_list = ", ".join(columns)
+
+        await self.db.execute(text(
+            f"CREATE TEMP TABLE {stage_name} ON COMMIT DROP AS "
+            f"SELECT {column_list} FROM {table_name} WITH NO DATA"
+        ))
+
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            stage_name,
+            records=[tuple(row[name] for name in columns) for row in rows],
+            columns=columns
+        )
+
+        stage = table(stage_name, *(column(name) for name in columns))
+        stmt = insert(model_class).from_select(columns, select(*stage.c))
+        result = await self.db.execute(self._build_upsert(stmt, model_class, constraint_column, mode))
+        return len(result.scalars().all())
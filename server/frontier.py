@@ -0,0 +1,159 @@
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import time
+import uuid
+
+
+class BloomFilter:
+    """
+    مجموعه احتمالاتی فشرده برای صفحات دیده‌شده: بدون false negative و با نرخ
+    false positive حداکثر error_rate تا capacity عضو (حدود 1.2 بایت برای هر عضو در 1%).
+    """
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(str(item).encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item) -> bool:
+        """عضو را اضافه می‌کند؛ اگر قبلا (احتمالا) وجود داشت False برمی‌گرداند."""
+        added = False
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                added = True
+        return added
+
+    def __contains__(self, item) -> bool:
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(item))
+
+
+class Frontier:
+    """
+    صف اولویت‌دار صفحات برای پیمایش گراف پیوندها. هر صفحه فقط یک بار زمان‌بندی می‌شود؛
+    عمق کمتر اول، و در یک عمق صفحاتی که از منابع بیشتری لینک شده‌اند اول.
+    فقط صفحات برداشته‌شده (محدود به بودجه crawl) وارد visited می‌شوند؛ نامزدها که چند برابر
+    بیشترند با یک set معمولی و فقط تا زمان برداشته شدن تکراری‌زدایی می‌شوند تا Bloom filter
+    از ظرفیتش پرتر نشود.
+    """
+
+    def __init__(self, visited: BloomFilter):
+        self.visited = visited
+        self._heap = []
+        self._queued = set()
+        self._counter = itertools.count()
+
+    def push(self, pageid: int, depth: int, score: int = 0) -> bool:
+        if pageid in self._queued or pageid in self.visited:
+            return False
+        self._queued.add(pageid)
+        heapq.heappush(self._heap, (depth, -score, next(self._counter), pageid))
+        return True
+
+    def pop_batch(self, size: int) -> list[tuple[int, int]]:
+        """حداکثر size صفحه را به صورت (pageid, depth) برمی‌دارد و visited علامت می‌زند."""
+        batch = []
+        while self._heap and len(batch) < size:
+            depth, _, _, pageid = heapq.heappop(self._heap)
+            self._queued.discard(pageid)
+            self.visited.add(pageid)
+            batch.append((pageid, depth))
+        return batch
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+class ShardQueue:
+    """
+    صف مشترک دسته‌های pageid روی Redis برای تقسیم یک crawl بین چند ورکر arq.
+    هر دسته با یک lease برداشته می‌شود؛ ورکر در حین پردازش lease را تمدید می‌کند و
+    اگر ورکر بمیرد، پس از انقضای lease دسته دوباره به صف برمی‌گردد.
+    """
+
+    # برداشتن اتمیک یک دسته به همراه بازگرداندن leaseهای منقضی‌شده به صف.
+    # عضو leases به شکل "token|batch" است تا ورکری که lease آن منقضی شده نتواند
+    # lease برداشت بعدی همان دسته را تمدید یا تمام کند.
+    CLAIM_SCRIPT = """
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+    for _, member in ipairs(expired) do
+        redis.call('ZREM', KEYS[2], member)
+        local separator = string.find(member, '|', 1, true)
+        redis.call('RPUSH', KEYS[1], string.sub(member, separator + 1))
+    end
+    local batch = redis.call('LPOP', KEYS[1])
+    if batch then
+        local lease = ARGV[3] .. '|' .. batch
+        redis.call('ZADD', KEYS[2], ARGV[2], lease)
+        return lease
+    end
+    return false
+    """
+
+    def __init__(self, redis_client, crawl_id: str, lease_seconds: float = 60, ttl_seconds: int = 24 * 3600):
+        self.redis = redis_client
+        self.lease_seconds = lease_seconds
+        self.ttl_seconds = ttl_seconds
+        prefix = f"crawl_shards:{crawl_id}"
+        self.pending_key = f"{prefix}:pending"
+        self.leases_key = f"{prefix}:leases"
+        self.stats_key = f"{prefix}:stats"
+        self._claim = redis_client.register_script(self.CLAIM_SCRIPT)
+
+    async def push_batches(self, batches: list[dict]):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(self.pending_key, *(json.dumps(batch) for batch in batches))
+            pipe.hincrby(self.stats_key, "batches_total", len(batches))
+            for key in (self.pending_key, self.leases_key, self.stats_key):
+                pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def claim(self) -> tuple[str, dict] | None:
+        """یک دسته برمی‌دارد: (شناسه lease برای heartbeat/complete، محتوای دسته) یا None."""
+        now = time.time()
+        lease = await self._claim(
+            keys=[self.pending_key, self.leases_key],
+            args=[now, now + self.lease_seconds, uuid.uuid4().hex]
+        )
+        if not lease:
+            return None
+        lease = lease.decode("utf-8") if isinstance(lease, bytes) else lease
+        return lease, json.loads(lease.split("|", 1)[1])
+
+    async def heartbeat(self, lease: str):
+        await self.redis.zadd(self.leases_key, {lease: time.time() + self.lease_seconds}, xx=True)
+
+    async def complete(self, lease: str, found: int, saved: int):
+        # اگر lease منقضی و دسته به ورکر دیگری داده شده باشد، آمار همان‌جا شمرده می‌شود
+        if await self.redis.zrem(self.leases_key, lease):
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hincrby(self.stats_key, "found", found)
+                pipe.hincrby(self.stats_key, "saved", saved)
+                pipe.hincrby(self.stats_key, "batches_done", 1)
+                await pipe.execute()
+
+    async def is_finished(self) -> bool:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.llen(self.pending_key)
+            pipe.zcard(self.leases_key)
+            pending, leased = await pipe.execute()
+        return pending == 0 and leased == 0
+
+    async def stats(self) -> dict:
+        raw = await self.redis.hgetall(self.stats_key)
+        stats = {"found": 0, "saved": 0, "batches_done": 0, "batches_total": 0}
+        for key, value in raw.items():
+            key = key.decode("utf-8") if isinstance(key, bytes) else key
+            stats[key] = int(value)
+        return stats
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+
+class ResponseCache:
+    """
+    کش پاسخ‌های HTTP برای BaseCrawler.fetch_page.
+    هر ورودی تا max_age ثانیه تازه است؛ تا max_stale ثانیه نگه داشته می‌شود تا
+    در صورت وجود ETag/Last-Modified با درخواست شرطی اعتبارسنجی شود.
+    حجم کل به max_entries ورودی و max_bytes بایت محدود است و پاسخ‌های بزرگ‌تر از
+    max_body_bytes (مثلا متن کامل مقالات خیلی بلند) اصلا کش نمی‌شوند.
+    """
+
+    def __init__(self, max_age: float = 3600, max_stale: float = 86400, max_entries: int = 5000,
+                 max_bytes: int = 256 * 1024 * 1024, max_body_bytes: int = 1024 * 1024):
+        self.max_age = max_age
+        self.max_stale = max(max_stale, max_age)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_body_bytes = min(max_body_bytes, max_bytes)
+
+    @staticmethod
+    def make_key(url_path: str, params: dict | None) -> str:
+        normalized = sorted(
+            (str(key), str(value)) for key, value in (params or {}).items() if value is not None
+        )
+        raw = f"{url_path}?{urlencode(normalized)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["stored_at"] < self.max_age
+
+    @staticmethod
+    def conditional_headers(entry: dict | None) -> dict:
+        headers = {}
+        if not entry:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    @staticmethod
+    def has_validators(entry: dict | None) -> bool:
+        return bool(entry and (entry.get("etag") or entry.get("last_modified")))
+
+    @staticmethod
+    def build_entry(body: str, headers) -> dict:
+        return {
+            "body": body,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "stored_at": time.time(),
+        }
+
+    async def get(self, key: str) -> dict | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, entry: dict):
+        raise NotImplementedError
+
+    async def refresh(self, key: str, entry: dict):
+        """پس از پاسخ 304، ورودی موجود را دوباره تازه می‌کند."""
+        entry = dict(entry, stored_at=time.time())
+        await self.set(key, entry)
+        return entry
+
+
+class MemoryResponseCache(ResponseCache):
+    """کش LRU درون‌پردازه‌ای با سقف تعداد ورودی و حجم (طول بدنه‌ها به کاراکتر، تقریب بایت)."""
+
+    def __init__(self, max_age: float = 3600, max_stale: float = 86400, max_entries: int = 5000,
+                 max_bytes: int = 256 * 1024 * 1024, max_body_bytes: int = 1024 * 1024):
+        super().__init__(max_age, max_stale, max_entries, max_bytes, max_body_bytes)
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._bytes = 0
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry["body"])
+
+    async def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["stored_at"] >= self.max_stale:
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: dict):
+        self._discard(key)
+        if len(entry["body"]) > self.max_body_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += len(entry["body"])
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, oldest = self._entries.popitem(last=False)
+            self._bytes -= len(oldest["body"])
+
+
+class RedisResponseCache(ResponseCache):
+    """
+    کش مشترک بین ورکرها روی Redis. هر ورودی با TTL برابر max_stale ذخیره می‌شود و
+    یک sorted set (امتیاز = زمان آخرین دسترسی) برای حذف LRU بیش از max_entries یا max_bytes،
+    به همراه hash اندازه هر ورودی و شمارنده حجم کل نگه داشته می‌شود.
+    """
+
+    # حذف یک ورودی به همراه کم کردن اندازه‌اش از شمارنده حجم
+    DROP_FUNCTION = """
+    local function drop(name)
+        local size = tonumber(redis.call('HGET', KEYS[2], name) or 0)
+        if size > 0 then
+            redis.call('HDEL', KEYS[2], name)
+            redis.call('DECRBY', KEYS[3], size)
+        end
+        redis.call('ZREM', KEYS[1], name)
+        redis.call('DEL', ARGV[1] .. name)
+    end
+    """
+
+    DROP_SCRIPT = DROP_FUNCTION + """
+    drop(ARGV[2])
+    return 0
+    """
+
+    # ذخیره اتمیک و حذف LRU تا زیر سقف تعداد و حجم؛ ورودی‌هایی که از آخرین دسترسی‌شان بیش از
+    # TTL گذشته (کلیدشان را Redis منقضی کرده) ابتدا کنار گذاشته می‌شوند تا شمارنده حجم دقیق بماند
+    SET_SCRIPT = DROP_FUNCTION + """
+    local member, now, ttl = ARGV[2], tonumber(ARGV[3]), tonumber(ARGV[6])
+    local max_entries, max_bytes = tonumber(ARGV[7]), tonumber(ARGV[8])
+    for _, name in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now - ttl)) do
+        drop(name)
+    end
+    drop(member)
+    redis.call('SET', ARGV[1] .. member, ARGV[4], 'EX', ttl)
+    redis.call('ZADD', KEYS[1], now, member)
+    redis.call('HSET', KEYS[2], member, ARGV[5])
+    local total = redis.call('INCRBY', KEYS[3], ARGV[5])
+    local evicted = 0
+    while redis.call('ZCARD', KEYS[1]) > max_entries or total > max_bytes do
+        local oldest = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+        if not oldest or oldest == member then
+            break
+        end
+        drop(oldest)
+        total = tonumber(redis.call('GET', KEYS[3]) or 0)
+        evicted = evicted + 1
+    end
+    return evicted
+    """
+
+    def __init__(self, redis_client, max_age: float = 3600, max_stale: float = 86400,
+                 max_entries: int = 5000, max_bytes: int = 256 * 1024 * 1024,
+                 max_body_bytes: int = 1024 * 1024, prefix: str = "http_cache"):
+        super().__init__(max_age, max_stale, max_entries, max_bytes, max_body_bytes)
+        self.redis = redis_client
+        self.prefix = prefix
+        self.lru_key = f"{prefix}:lru"
+        self.sizes_key = f"{prefix}:sizes"
+        self.bytes_key = f"{prefix}:bytes"
+        self._set = redis_client.register_script(self.SET_SCRIPT)
+        self._drop = redis_client.register_script(self.DROP_SCRIPT)
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _script_keys(self) -> list[str]:
+        return [self.lru_key, self.sizes_key, self.bytes_key]
+
+    async def get(self, key: str) -> dict | None:
+        raw = await self.redis.get(self._entry_key(key))
+        if raw is None:
+            await self._drop(keys=self._script_keys(), args=[f"{self.prefix}:", key])
+            return None
+        await self.redis.zadd(self.lru_key, {key: time.time()})
+        return json.loads(raw)
+
+    async def set(self, key: str, entry: dict):
+        payload = json.dumps(entry).encode("utf-8")
+        if len(payload) > self.max_body_bytes:
+            # نسخه کوچک‌تر قبلی همین پاسخ کهنه است
+            await self._drop(keys=self._script_keys(), args=[f"{self.prefix}:", key])
+            return
+        await self._set(keys=self._script_keys(), args=[
+            f"{self.prefix}:", key, time.time(), payload, len(payload),
+            int(self.max_stale), self.max_entries, self.max_bytes
+        ])
+
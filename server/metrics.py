@@ -0,0 +1,80 @@
+import time
+from datetime import datetime, timezone
+
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# مرزهای histogram زمان (ثانیه): از چند میلی‌ثانیه (parse/صف) تا چند دقیقه (کل job)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800)
+ROWS_BUCKETS = (1, 5, 10, 20, 50, 100, 500, 1000, 5000, 10000)
+
+HTTP_FETCH_SECONDS = Histogram(
+    "crawler_http_fetch_seconds", "Latency of upstream HTTP requests",
+    ["endpoint", "status"], buckets=LATENCY_BUCKETS
+)
+SLOT_WAIT_SECONDS = Histogram(
+    "crawler_slot_wait_seconds", "Time spent waiting for the crawler semaphore or host rate limiter",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+PARSE_SECONDS = Histogram(
+    "crawler_parse_seconds", "Time spent parsing upstream responses",
+    ["kind"], buckets=LATENCY_BUCKETS
+)
+RETRIES = Counter("crawler_retries_total", "Upstream requests retried", ["endpoint", "reason"])
+ERRORS = Counter("crawler_errors_total", "Errors by component", ["component", "kind"])
+
+DB_SAVE_SECONDS = Histogram(
+    "db_save_seconds", "Duration of DataSaverAsync.save_items",
+    ["table", "method"], buckets=LATENCY_BUCKETS
+)
+DB_SAVE_ROWS = Histogram(
+    "db_save_rows", "Rows inserted or updated per save_items call",
+    ["table", "method"], buckets=ROWS_BUCKETS
+)
+
+JOB_QUEUE_WAIT_SECONDS = Histogram(
+    "job_queue_wait_seconds", "Time between enqueue and start of an arq job",
+    ["function"], buckets=JOB_BUCKETS
+)
+JOB_RUN_SECONDS = Histogram(
+    "job_run_seconds", "Run time of arq jobs",
+    ["function", "status"], buckets=JOB_BUCKETS
+)
+
+API_REQUEST_SECONDS = Histogram(
+    "api_request_seconds", "Latency of API requests",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Connections in the SQLAlchemy pool by state",
+    ["engine", "state"]
+)
+DB_POOL_SATURATION = Gauge(
+    "db_pool_saturation", "Checked-out connections as a fraction of pool_size + max_overflow",
+    ["engine"]
+)
+
+
+def register_db_pool_metrics(pool_stats):
+    """gaugeهای pool هنگام scrape از pool_stats (shared.database) خوانده می‌شوند."""
+    for engine in pool_stats():
+        for state in ("checked_out", "checked_in", "overflow"):
+            DB_POOL_CONNECTIONS.labels(engine, state).set_function(
+                lambda engine=engine, state=state: pool_stats()[engine][state]
+            )
+        DB_POOL_SATURATION.labels(engine).set_function(lambda engine=engine: pool_stats()[engine]["saturation"])
+
+
+def observe_queue_wait(ctx, function: str):
+    """زمان انتظار job در صف arq را از enqueue_time (که arq در ctx می‌گذارد) ثبت می‌کند."""
+    enqueue_time = ctx.get('enqueue_time')
+    if enqueue_time:
+        wait = (datetime.now(timezone.utc) - enqueue_time).total_seconds()
+        JOB_QUEUE_WAIT_SECONDS.labels(function).observe(max(0.0, wait))
+
+
+def observe_job_run(function: str, result, started: float):
+    status = result.get("status", "unknown") if isinstance(result, dict) else "unknown"
+    JOB_RUN_SECONDS.labels(function, status).observe(time.perf_counter() - started)
@@ -0,0 +1,82 @@
+"""
+پارس پاسخ‌های API مدیاویکی. همه توابع سطح ماژول و بدون وابستگی به کراولر هستند تا
+بتوان آن‌ها را بیرون از event loop (thread یا process pool) اجرا کرد.
+"""
+import html
+import json
+import re
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # orjson اختیاری است؛ بدون آن از json استاندارد استفاده می‌شود
+    orjson = None
+
+
+# خطاهای json و orjson هر دو زیرکلاس ValueError هستند؛ AttributeError برای ساختار غیرمنتظره است
+PARSE_ERRORS = (ValueError, AttributeError, TypeError)
+
+TAG_PATTERN = re.compile(r"<[^>]*>")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def loads(content: str | bytes):
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def clean_snippet(snippet_html: str | None) -> str:
+    """تگ‌های HTML اسنیپت جستجو (مثل span.searchmatch) را حذف و entityها را باز می‌کند."""
+    if not snippet_html:
+        return ""
+    text = html.unescape(TAG_PATTERN.sub("", snippet_html))
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def parse_timestamp(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def parse_search_response(content: str | bytes) -> tuple[list[dict], dict]:
+    """نتایج list=search و پارامترهای continue را با یک بار decode برمی‌گرداند."""
+    data = loads(content)
+    articles = []
+    for item in data.get("query", {}).get("search", []):
+        title = item.get("title")
+        summary = clean_snippet(item.get("snippet"))
+        pageid = item.get("pageid")
+        if title and summary and pageid:
+            articles.append({
+                "pageid": pageid,
+                "title": title,
+                "summary": summary,
+                # زمان آخرین ویرایش (رشته ISO)؛ ستون جدول نیست و هنگام ذخیره کنار گذاشته می‌شود
+                "timestamp": item.get("timestamp"),
+            })
+    return articles, data.get("continue", {})
+
+
+def parse_details_response(content: str | bytes) -> tuple[dict, dict]:
+    """خروجی prop=extracts|info را به صورت {pageid: جزئیات} به همراه continue برمی‌گرداند."""
+    data = loads(content)
+    details_map = {}
+    for page_id_str, page_data in data.get("query", {}).get("pages", {}).items():
+        details_map[int(page_id_str)] = {
+            "full_text": page_data.get("extract"),
+            "url": page_data.get("fullurl"),
+            "lastrevid": page_data.get("lastrevid"),
+            "touched": parse_timestamp(page_data.get("touched")),
+        }
+    return details_map, data.get("continue", {})
+
+
+def parse_pages_response(content: str | bytes) -> tuple[dict, dict]:
+    """query.pages خام (مثلا برای generator=links یا prop=info) و continue."""
+    data = loads(content)
+    return data.get("query", {}).get("pages", {}), data.get("continue", {})
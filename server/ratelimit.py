@@ -0,0 +1,121 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+
+
+class HostRateLimiter:
+    """
+    محدودکننده نرخ برای یک میزبان: token bucket برای تعداد درخواست در ثانیه و
+    سقف هم‌زمانی تطبیقی (AIMD): با هر throttle یا هر error_threshold خطای پیاپی (5xx/خطای اتصال)
+    نصف می‌شود و با موفقیت‌های پیاپی یکی بالا می‌رود.
+    Retry-After همه درخواست‌های این میزبان را تا زمان مشخص‌شده متوقف می‌کند.
+    """
+
+    def __init__(self, rate: float = 10.0, burst: int = 10, min_concurrency: int = 1, max_concurrency: int = 10,
+                 error_threshold: int = 3):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.error_threshold = error_threshold
+        self.errors = 0
+
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Condition()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def _take_token(self):
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+        try:
+            await self._take_token()
+            yield
+        finally:
+            async with self._slots:
+                self.in_flight -= 1
+                self._slots.notify_all()
+
+    def record_success(self):
+        self.errors = 0
+        self.successes += 1
+        if self.successes >= self.concurrency and self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+            self.successes = 0
+
+    def record_error(self):
+        self.successes = 0
+        self.errors += 1
+        if self.errors >= self.error_threshold:
+            self.errors = 0
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+            print(f"Repeated errors: concurrency lowered to {self.concurrency}.")
+
+    def record_throttle(self, retry_after: float | None = None):
+        self.successes = 0
+        self.errors = 0
+        self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        print(f"Throttled: concurrency lowered to {self.concurrency}"
+              f"{f', pausing {retry_after:.1f}s' if retry_after else ''}.")
+
+
+class RateLimiterRegistry:
+    """یک HostRateLimiter برای هر میزبان؛ بین همه jobهای یک پردازه ورکر مشترک است."""
+
+    def __init__(self, rate: float = 10.0, burst: int = 10, min_concurrency: int = 1, max_concurrency: int = 10,
+                 error_threshold: int = 3):
+        self.options = dict(rate=rate, burst=burst, min_concurrency=min_concurrency, max_concurrency=max_concurrency,
+                            error_threshold=error_threshold)
+        self._limiters: dict[str, HostRateLimiter] = {}
+
+    def get(self, host: str) -> HostRateLimiter:
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = self._limiters[host] = HostRateLimiter(**self.options)
+        return limiter
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """تأخیر نمایی با jitter کامل."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
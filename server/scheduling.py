@@ -0,0 +1,190 @@
+import asyncio
+import json
+import time
+
+from arq.constants import health_check_key_suffix, in_progress_key_prefix
+
+
+class FairScheduler:
+    """
+    صف منصفانه جلوی صف‌های arq: jobها ابتدا در لیست جداگانه هر tenant (به تفکیک اولویت)
+    می‌مانند و dispatcher به صورت round-robin بین tenantها فقط وقتی job به صف arq می‌فرستد
+    که تعداد jobهای منتظر (نه در حال اجرا) آن صف کمتر از max_queue_depth باشد. به این ترتیب
+    صدها job یک tenant سنگین جلوی اولین job یک tenant دیگر قرار نمی‌گیرند.
+    """
+
+    # ثبت اتمیک: marker یکتای job (برای deduplication و وضعیت)، لیست tenant و حلقه tenantها
+    SUBMIT_SCRIPT = """
+    if not redis.call('SET', KEYS[3], ARGV[3], 'NX', 'EX', ARGV[4]) then
+        return 0
+    end
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+    if not redis.call('LPOS', KEYS[1], ARGV[2]) then
+        redis.call('RPUSH', KEYS[1], ARGV[2])
+    end
+    return 1
+    """
+
+    # برداشتن اتمیک job بعدی: tenant سر حلقه به انتها می‌رود و اگر لیستش خالی شد از حلقه حذف می‌شود
+    POP_SCRIPT = """
+    local tenant = redis.call('LMOVE', KEYS[1], KEYS[1], 'LEFT', 'RIGHT')
+    if not tenant then
+        return false
+    end
+    local tenant_key = ARGV[1] .. tenant
+    local job = redis.call('LPOP', tenant_key)
+    if redis.call('LLEN', tenant_key) == 0 then
+        redis.call('LREM', KEYS[1], 0, tenant)
+    end
+    return job
+    """
+
+    # بازگرداندن اتمیک job ناموفق به سر لیست tenant و نوبت همان tenant به سر حلقه
+    REQUEUE_SCRIPT = """
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+    redis.call('LREM', KEYS[1], 0, ARGV[2])
+    redis.call('LPUSH', KEYS[1], ARGV[2])
+    return 1
+    """
+
+    def __init__(self, redis_client, arq_pool, queues: dict[str, str], max_queue_depth: int = 10,
+                 pending_ttl_seconds: int = 24 * 3600, fallbacks: dict[str, str] | None = None):
+        """
+        queues: نام اولویت -> نام صف arq، به ترتیب اولویت dispatch.
+        fallbacks: اولویت -> اولویت جایگزین؛ اگر هیچ ورکری صف یک اولویت را نخواند (کلید health-check
+        arq وجود نداشته باشد)، jobهای آن یکی‌یکی و فقط وقتی صف جایگزین منتظری ندارد به آن فرستاده می‌شوند.
+        """
+        self.redis = redis_client
+        self.arq_pool = arq_pool
+        self.queues = queues
+        self.fallbacks = fallbacks or {}
+        self.max_queue_depth = max_queue_depth
+        self.pending_ttl_seconds = pending_ttl_seconds
+        self._submit = redis_client.register_script(self.SUBMIT_SCRIPT)
+        self._pop = redis_client.register_script(self.POP_SCRIPT)
+        self._requeue = redis_client.register_script(self.REQUEUE_SCRIPT)
+
+    @staticmethod
+    def ring_key(priority: str) -> str:
+        return f"crawl_sched:{priority}:tenants"
+
+    @staticmethod
+    def tenant_prefix(priority: str) -> str:
+        return f"crawl_sched:{priority}:tenant:"
+
+    @staticmethod
+    def pending_key(job_id: str) -> str:
+        return f"crawl_sched:pending:{job_id}"
+
+    async def submit(self, job_id: str, function: str, args: list, tenant: str, priority: str) -> bool:
+        """job را در نوبت tenant قرار می‌دهد؛ اگر همین job_id در انتظار dispatch باشد False برمی‌گرداند."""
+        if priority not in self.queues:
+            raise ValueError(f"Unknown priority: {priority}")
+        entry = json.dumps({"job_id": job_id, "function": function, "args": args,
+                            "tenant": tenant, "submitted_at": time.time()})
+        submitted = await self._submit(
+            keys=[self.ring_key(priority), self.tenant_prefix(priority) + tenant, self.pending_key(job_id)],
+            args=[entry, tenant, priority, self.pending_ttl_seconds]
+        )
+        return bool(submitted)
+
+    async def is_pending(self, job_id: str) -> bool:
+        return bool(await self.redis.exists(self.pending_key(job_id)))
+
+    async def queue_jobs(self, queue_name: str) -> tuple[list[tuple[str, float]], int]:
+        """
+        ([(job_id, زمان ورود به صف به ms)] jobهای منتظر به ترتیب قدمت، تعداد در حال اجرا).
+        arq job را تا پایان اجرا در zset صف نگه می‌دارد؛ در حال اجراها با کلید in-progress جدا
+        می‌شوند و jobهای deferred (امتیاز در آینده، مثل cron) منتظر حساب نمی‌شوند.
+        """
+        members = await self.arq_pool.zrangebyscore(queue_name, "-inf", time.time() * 1000, withscores=True)
+        if not members:
+            return [], 0
+        job_ids = [job_id.decode() if isinstance(job_id, bytes) else job_id for job_id, _ in members]
+        async with self.arq_pool.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.exists(in_progress_key_prefix + job_id)
+            running = await pipe.execute()
+        waiting = [
+            (job_id, score) for job_id, (_, score), is_running in zip(job_ids, members, running)
+            if not is_running
+        ]
+        return waiting, sum(1 for is_running in running if is_running)
+
+    async def has_worker(self, queue_name: str) -> bool:
+        """ورکر arq هر health_check_interval کلید health-check صفش را با TTL تمدید و هنگام توقف حذف می‌کند."""
+        return bool(await self.arq_pool.exists(queue_name + health_check_key_suffix))
+
+    async def dispatch_once(self) -> int:
+        """برای هر اولویت تا پر شدن ظرفیت صف arq، job بعدی را به نوبت tenantها منتقل می‌کند."""
+        dispatched = 0
+        for priority, queue_name in self.queues.items():
+            fallback = self.fallbacks.get(priority)
+            if fallback and not await self.has_worker(queue_name):
+                # بدون ورکر مخصوص: هر دور حداکثر یک job، و فقط وقتی صف جایگزین بیکار است
+                queue_name = self.queues[fallback]
+                waiting, _ = await self.queue_jobs(queue_name)
+                free_slots = 0 if waiting else 1
+            else:
+                waiting, _ = await self.queue_jobs(queue_name)
+                free_slots = self.max_queue_depth - len(waiting)
+            for _ in range(max(0, free_slots)):
+                raw = await self._pop(keys=[self.ring_key(priority)], args=[self.tenant_prefix(priority)])
+                if not raw:
+                    break
+                entry = json.loads(raw)
+                try:
+                    job = await self.arq_pool.enqueue_job(
+                        entry["function"], *entry["args"], _job_id=entry["job_id"], _queue_name=queue_name
+                    )
+                except Exception as e:
+                    # job و marker آن می‌مانند تا دور بعد دوباره dispatch شود
+                    print(f"Could not dispatch job {entry['job_id']}, will retry: {e}")
+                    await self._requeue(
+                        keys=[self.ring_key(priority), self.tenant_prefix(priority) + entry["tenant"]],
+                        args=[raw, entry["tenant"]]
+                    )
+                    return dispatched
+                # None یعنی همین job_id در این فاصله از مسیر دیگری در arq ثبت شده است
+                await self.redis.delete(self.pending_key(entry["job_id"]))
+                if job:
+                    dispatched += 1
+        return dispatched
+
+    async def run(self, poll_interval: float = 0.5):
+        """حلقه dispatcher (یک task پس‌زمینه در سرور)."""
+        while True:
+            try:
+                if not await self.dispatch_once():
+                    await asyncio.sleep(poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Scheduler dispatch error: {e}")
+                await asyncio.sleep(poll_interval)
+
+    async def stats(self, priority: str) -> dict:
+        """تعداد jobهای در انتظار هر tenant و قدیمی‌ترین زمان انتظار پیش از dispatch."""
+        tenants = [
+            tenant.decode() if isinstance(tenant, bytes) else tenant
+            for tenant in await self.redis.lrange(self.ring_key(priority), 0, -1)
+        ]
+        pending = {}
+        oldest = None
+        for tenant in tenants:
+            key = self.tenant_prefix(priority) + tenant
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.llen(key)
+                pipe.lindex(key, 0)
+                length, head = await pipe.execute()
+            if not length:
+                continue
+            pending[tenant] = length
+            if head:
+                submitted_at = json.loads(head)["submitted_at"]
+                oldest = submitted_at if oldest is None else min(oldest, submitted_at)
+        return {
+            "pending": sum(pending.values()),
+            "pending_by_tenant": pending,
+            "oldest_pending_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+        }
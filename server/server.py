@@ -1,16 +1,37 @@
-from typing import List, Dict, Any, Optional
+import csv
+import hashlib
+import io
+import json
+import asyncio
+import os
+import statistics
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Literal, Optional, AsyncIterator
 import redis.asyncio as redis
 from arq import create_pool
 from arq.connections import ArqRedis, RedisSettings
-from arq.jobs import Job
-from fastapi import FastAPI, Depends, HTTPException
+from arq.constants import result_key_prefix, in_progress_key_prefix
+from arq.jobs import Job, JobStatus as ArqJobStatus, deserialize_result
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
+from sqlalchemy import func, text, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import undefer
 from shared import database
-from .worker import REDIS_HOST, REDIS_PORT
+from .metrics import API_REQUEST_SECONDS, register_db_pool_metrics
+from .scheduling import FairScheduler
+from .worker import (
+    BATCH_TTL_SECONDS, JOB_QUEUES, QUEUE_FALLBACKS, REDIS_HOST, REDIS_PORT,
+    batch_key, batch_results_key, job_batches_key, job_events_channel, job_progress_key, queue_waits_key
+)
 
 app = FastAPI(title="API جستجوگر ویکی‌پدیا", version="5.0")
 
@@ -28,10 +49,88 @@ class WikipediaArticleSchema(BaseModel):
     class Config: from_attributes = True
 
 
+class ArticlePage(BaseModel):
+
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[int] = None
+
+
+class ArticleChanges(BaseModel):
+
+    items: List[Dict[str, Any]]
+    next_since: Optional[datetime] = None
+    next_after_id: Optional[int] = None
+    has_more: bool
+
+
+class SearchResult(BaseModel):
+
+    id: int
+    pageid: int
+    title: str
+    url: Optional[str] = None
+    rank: float
+    snippet: Optional[str] = None
+
+
+class SearchPage(BaseModel):
+
+    items: List[SearchResult]
+    page: int
+    limit: int
+    has_more: bool
+
+
+class StorageStats(BaseModel):
+
+    articles: int
+    sampled_articles: int
+    avg_full_text_bytes: float
+    avg_full_text_stored_bytes: float
+    compression_ratio: Optional[float] = None
+    heap_bytes: int
+    toast_bytes: int
+    index_bytes: int
+    total_bytes: int
+    bytes_per_article: float
+
+
 class CrawlRequest(BaseModel):
 
     crawler_name: str
     params: Dict[str, Any] = {}
+    priority: Literal["interactive", "bulk"] = "interactive"
+
+
+class BatchCrawlRequest(BaseModel):
+
+    crawler_name: str = "wikipedia"
+    search_terms: List[str]
+    params: Dict[str, Any] = {}
+    priority: Literal["interactive", "bulk"] = "bulk"
+
+
+class BatchResponse(BaseModel):
+
+    batch_id: str
+    total: int
+    queued: int
+    deduplicated: int
+    cached: int
+
+
+class BatchStatus(BaseModel):
+
+    batch_id: str
+    total: int
+    queued: int
+    in_progress: int
+    complete: int
+    failed: int
+    found: int
+    saved: int
+    progress: float
+    done: bool
 
 
 class JobResponse(BaseModel):
@@ -47,14 +146,314 @@ class JobStatus(BaseModel):
     result: dict | None = None
 
 
+class QueueStats(BaseModel):
+
+    priority: str
+    queue_name: str
+    queued: int
+    running: int
+    oldest_queued_seconds: float
+    worker_alive: bool
+    scheduler_pending: int
+    scheduler_pending_by_tenant: Dict[str, int]
+    oldest_pending_seconds: float
+    recent_wait_p50_seconds: Optional[float] = None
+    recent_wait_p95_seconds: Optional[float] = None
+    recent_wait_samples: int
+
+
+
+# ستون‌هایی که در لیست مقالات قابل انتخاب هستند (full_text فقط در endpoint جزئیات)
+ARTICLE_LIST_FIELDS = ("id", "pageid", "title", "summary", "url")
+ARTICLE_PAGE_DEFAULT_LIMIT = 50
+ARTICLE_PAGE_MAX_LIMIT = 500
+ARTICLE_EXPORT_FIELDS = ARTICLE_LIST_FIELDS + ("full_text",)
+ARTICLE_CHANGES_DEFAULT_LIMIT = 500
+ARTICLE_CHANGES_MAX_LIMIT = 5000
+EXPORT_YIELD_PER = 1000
+SEARCH_MAX_LIMIT = 100
+# میانگین اندازه متن روی آخرین ردیف‌ها حساب می‌شود تا آمار روی جدول بزرگ ارزان بماند
+STORAGE_STATS_SAMPLE_ROWS = 10000
+# ts_headline روی کل متن‌های چند صد کیلوبایتی کند است؛ فقط ابتدای متن بررسی می‌شود
+SEARCH_HEADLINE_CHARS = 50000
+SEARCH_HEADLINE_OPTIONS = "MaxFragments=2, MaxWords=30, MinWords=10, StartSel=<b>, StopSel=</b>"
+
+
+def parse_article_fields(fields: Optional[str], allowed: tuple = ARTICLE_LIST_FIELDS) -> list[str]:
+    if not fields:
+        return list(allowed)
+
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"فیلدهای نامعتبر: {', '.join(unknown)} (مجاز: {', '.join(allowed)})"
+        )
+    # id همیشه برای ساخت cursor لازم است
+    if "id" not in requested:
+        requested.insert(0, "id")
+    return list(dict.fromkeys(requested))
+
+
+async def stream_article_rows(field_names: list[str], since_id: int) -> AsyncIterator[dict]:
+    """ردیف‌ها را با یک server-side cursor و به ترتیب صعودی id می‌خواند (حافظه ثابت)."""
+    columns = [getattr(database.WikipediaArticle, name) for name in field_names]
+    query = (
+        select(*columns)
+        .where(database.WikipediaArticle.id > since_id)
+        .order_by(database.WikipediaArticle.id.asc())
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    async with database.AsyncReadEngine.connect() as conn:
+        result = await conn.stream(query)
+        async for row in result.mappings():
+            yield dict(row)
+
+
+async def encode_ndjson(rows: AsyncIterator[dict], field_names: list[str]) -> AsyncIterator[bytes]:
+    async for row in rows:
+        yield (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def encode_csv(rows: AsyncIterator[dict], field_names: list[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=field_names)
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # 31 = فرمت gzip
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+# نتیجه یک job موفق تا این مدت (ثانیه) برای درخواست‌های یکسان دوباره استفاده می‌شود.
+# باید از keep_result ورکر (پیش‌فرض arq: 3600) کمتر باشد.
+CRAWL_RESULT_FRESHNESS = int(os.getenv("CRAWL_RESULT_FRESHNESS", "600"))
+
+
+def normalize_task_details(task_details: dict) -> dict:
+    """فاصله‌های اضافه را حذف و نام کراولر را یکسان می‌کند تا درخواست‌های هم‌معنا یک کلید داشته باشند."""
+    params = {}
+    for key, value in sorted(task_details.get("params", {}).items()):
+        params[key] = " ".join(value.split()) if isinstance(value, str) else value
+    return {
+        "crawler_name": str(task_details.get("crawler_name", "")).strip().lower(),
+        "params": params,
+    }
+
+
+def crawl_job_key(task_details: dict) -> str:
+    """کلید قطعی job؛ جستجوی ویکی‌پدیا به بزرگی و کوچکی حروف حساس نیست."""
+    canonical = {
+        "crawler_name": task_details["crawler_name"],
+        "params": {
+            key: value.casefold() if isinstance(value, str) else value
+            for key, value in task_details["params"].items()
+        },
+    }
+    digest = hashlib.sha1(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"crawl:{digest}"
+
+
+# صف arq هر اولویت حداکثر این تعداد job منتظر (شروع‌نشده) دارد؛ بقیه در نوبت tenantها (FairScheduler) می‌مانند
+SCHEDULER_QUEUE_DEPTH = int(os.getenv("SCHEDULER_QUEUE_DEPTH", "10"))
+TENANT_HEADER = "X-Client-Id"
+
+
+def request_tenant(http_request: Request) -> str:
+    """شناسه tenant برای سهم منصفانه: هدر X-Client-Id یا در نبود آن IP کلاینت."""
+    tenant = (http_request.headers.get(TENANT_HEADER) or "").strip()
+    if tenant:
+        return tenant[:100]
+    return http_request.client.host if http_request.client else "anonymous"
+
+
+async def arq_job_status(job_id: str) -> ArqJobStatus:
+    """وضعیت job در هر یک از صف‌های اولویت (Job.status فقط یک صف را برای queued بررسی می‌کند)."""
+    status = ArqJobStatus.not_found
+    for queue_name in JOB_QUEUES.values():
+        status = await Job(job_id, arq_pool, _queue_name=queue_name).status()
+        if status != ArqJobStatus.not_found:
+            break
+    return status
+
+
+async def enqueue_crawl_job(task_details: dict, tenant: str, priority: str = "interactive") -> tuple[str, str]:
+    """
+    job را با شناسه قطعی در نوبت tenant (FairScheduler) می‌گذارد. خروجی: (job_id, وضعیت) که وضعیت یکی از
+    queued (job جدید)، deduplicated (اتصال به job در حال اجرا/در صف) یا cached (نتیجه تازه موجود) است.
+    """
+    task_details = normalize_task_details(task_details)
+    job_id = crawl_job_key(task_details)
+
+    if await scheduler.is_pending(job_id):
+        return job_id, "deduplicated"
+
+    status = await arq_job_status(job_id)
+    if status in (ArqJobStatus.queued, ArqJobStatus.deferred, ArqJobStatus.in_progress):
+        return job_id, "deduplicated"
+
+    if status == ArqJobStatus.complete:
+        info = await Job(job_id, arq_pool).result_info()
+        if info and info.success and isinstance(info.result, dict) and info.result.get("status") == "success":
+            age = (datetime.now(timezone.utc) - info.finish_time).total_seconds()
+            if age < CRAWL_RESULT_FRESHNESS:
+                return job_id, "cached"
+        # نتیجه قدیمی یا ناموفق: حذف و اجرای دوباره
+        await arq_pool.delete(result_key_prefix + job_id)
+
+    # کلید job بدون priority و submitted_at ساخته شده تا درخواست‌های یکسان با هر اولویتی یکی شوند
+    payload = {**task_details, "priority": priority, "submitted_at": time.time()}
+    submitted = await scheduler.submit(job_id, 'run_crawl_task', [payload], tenant=tenant, priority=priority)
+    return job_id, "queued" if submitted else "deduplicated"
+
+
+BATCH_MAX_TERMS = 5000
+BATCH_ENQUEUE_CONCURRENCY = 100
+BATCH_STATUS_CHUNK = 500
+# فیلد نگهدارنده hash نتایج batch (تا hash با TTL از ابتدا وجود داشته باشد)
+BATCH_CREATED_FIELD = "_created"
+
+
+def job_outcome(raw_result) -> dict:
+    """نتیجه سریال‌شده arq را به dict نتیجه job تبدیل می‌کند (خطاها و timeoutها failed هستند)."""
+    info = deserialize_result(raw_result, deserializer=arq_pool.job_deserializer)
+    if info.success and isinstance(info.result, dict):
+        return info.result
+    return {"status": "failed", "error": str(info.result)}
+
+
+async def store_batch_outcomes(batch_id: str, job_ids: list[str]) -> dict[str, dict]:
+    """نتایج arq موجود برای job_ids را در hash خود batch کپی می‌کند تا پس از انقضای نتیجه arq باقی بمانند."""
+    outcomes = {}
+    for i in range(0, len(job_ids), BATCH_STATUS_CHUNK):
+        chunk = job_ids[i:i + BATCH_STATUS_CHUNK]
+        raw_results = await arq_pool.mget([result_key_prefix + job_id for job_id in chunk])
+        outcomes.update({
+            job_id: job_outcome(raw_result) for job_id, raw_result in zip(chunk, raw_results) if raw_result is not None
+        })
+    if outcomes:
+        await arq_pool.hset(batch_results_key(batch_id), mapping={
+            job_id: json.dumps(outcome, ensure_ascii=False) for job_id, outcome in outcomes.items()
+        })
+    return outcomes
+
+
+async def collect_batch_status(batch_id: str, job_ids: list[str]) -> BatchStatus:
+    """
+    نتیجه jobها ابتدا از hash خود batch (ثبت‌شده توسط ورکر) خوانده می‌شود؛ برای بقیه نتیجه arq
+    (که در hash کپی می‌شود) و کلید in-progress با pipeline بررسی می‌شوند.
+    """
+    counts = {"queued": 0, "in_progress": 0, "complete": 0, "failed": 0, "found": 0, "saved": 0}
+
+    stored = await arq_pool.hgetall(batch_results_key(batch_id))
+    outcomes = {
+        (key.decode() if isinstance(key, bytes) else key): json.loads(value)
+        for key, value in stored.items()
+        if (key.decode() if isinstance(key, bytes) else key) != BATCH_CREATED_FIELD
+    }
+    unfinished = [job_id for job_id in job_ids if job_id not in outcomes]
+    outcomes.update(await store_batch_outcomes(batch_id, unfinished))
+
+    unfinished = [job_id for job_id in unfinished if job_id not in outcomes]
+    for i in range(0, len(unfinished), BATCH_STATUS_CHUNK):
+        chunk = unfinished[i:i + BATCH_STATUS_CHUNK]
+        async with arq_pool.pipeline(transaction=False) as pipe:
+            for job_id in chunk:
+                pipe.exists(in_progress_key_prefix + job_id)
+            in_progress = await pipe.execute()
+        counts["in_progress"] += sum(1 for running in in_progress if running)
+        counts["queued"] += sum(1 for running in in_progress if not running)
+
+    for job_id in job_ids:
+        result = outcomes.get(job_id)
+        if result is None:
+            continue
+        if result.get("status") == "success":
+            counts["complete"] += 1
+            counts["found"] += result.get("found", 0)
+            counts["saved"] += result.get("saved", 0)
+        else:
+            counts["failed"] += 1
+
+    total = len(job_ids)
+    finished = counts["complete"] + counts["failed"]
+    return BatchStatus(
+        batch_id=batch_id,
+        total=total,
+        progress=finished / total if total else 1.0,
+        done=finished == total,
+        **counts
+    )
+
+
+# SSE: هر این تعداد ثانیه یک کامنت keep-alive ارسال می‌شود
+SSE_HEARTBEAT_SECONDS = 15
+TERMINAL_JOB_STATUSES = {"complete", "failed", "not_found"}
+
 
+def format_sse(payload: dict) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def job_event_stream(job_id: str) -> AsyncIterator[str]:
+    """
+    ابتدا subscribe و سپس وضعیت فعلی خوانده می‌شود تا تغییری بین این دو از دست نرود؛
+    پس از آن رویدادهایی که ورکر منتشر می‌کند ارسال می‌شوند. در هر heartbeat وضعیت دوباره خوانده
+    می‌شود، چون job لغوشده (job_timeout/abort) یا ورکر از کار افتاده رویداد پایانی منتشر نمی‌کند.
+    """
+    pubsub = redis_client.pubsub()
+    await pubsub.subscribe(job_events_channel(job_id))
+    try:
+        snapshot = await read_job_status(job_id)
+        yield format_sse({"job_id": job_id, **snapshot.dict()})
+        if snapshot.status in TERMINAL_JOB_STATUSES:
+            return
+
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=SSE_HEARTBEAT_SECONDS)
+            if message is None:
+                snapshot = await read_job_status(job_id)
+                if snapshot.status in TERMINAL_JOB_STATUSES:
+                    yield format_sse({"job_id": job_id, **snapshot.dict()})
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            event = json.loads(message["data"])
+            yield format_sse(event)
+            if event.get("status") in TERMINAL_JOB_STATUSES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+
+
+redis_client: redis.Redis = None
 arq_pool: ArqRedis = None
+scheduler: FairScheduler = None
+dispatcher_task: asyncio.Task = None
 
 @app.on_event("startup")
 async def startup_event():
     print("FastAPI server starting up (v5.0 - Wikipedia Only)...")
     await database.create_db_and_tables_async()
+    register_db_pool_metrics(database.pool_stats)
+    if database.DATABASE_READ_URL:
+        print("API reads use the DATABASE_READ_URL replica.")
 
+    global redis_client
     redis_url = f"redis://{REDIS_HOST}:{REDIS_PORT}"
     redis_client = await redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
     await FastAPILimiter.init(redis_client)
@@ -64,15 +463,39 @@ async def startup_event():
     arq_pool = await create_pool(RedisSettings(host=REDIS_HOST, port=REDIS_PORT))
     print("ARQ pool created for job enqueueing.")
 
+    global scheduler, dispatcher_task
+    scheduler = FairScheduler(
+        redis_client, arq_pool, JOB_QUEUES, max_queue_depth=SCHEDULER_QUEUE_DEPTH, fallbacks=QUEUE_FALLBACKS
+    )
+    dispatcher_task = asyncio.create_task(scheduler.run())
+    print(f"Fair scheduler started (queues: {', '.join(JOB_QUEUES.values())}).")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if dispatcher_task:
+        dispatcher_task.cancel()
     await FastAPILimiter.close()
+    if redis_client:
+        await redis_client.aclose()
     if arq_pool:
         await arq_pool.close()
+    await database.dispose_engines()
     print("FastAPI server shut down gracefully.")
 
 
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # الگوی مسیر (نه مسیر واقعی) تا برچسب‌ها کم‌تنوع بمانند؛ برای پاسخ‌های استریم فقط زمان تا شروع پاسخ است
+    route = request.scope.get("route")
+    API_REQUEST_SECONDS.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
+
+
 
 @app.get("/", summary="Root Endpoint")
 async def read_root():
@@ -80,32 +503,150 @@ async def read_root():
     return {"message": "به API جستجوگر سازمانی ویکی‌پدیا خوش آمدید (نسخه 5.0)."}
 
 
+@app.get("/metrics", summary="متریک‌های Prometheus", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/db/pool", summary="وضعیت pool اتصال‌های پایگاه داده (خواندن/نوشتن)")
+async def get_db_pool_stats():
+    """saturation نزدیک 1 یعنی درخواست‌ها منتظر اتصال آزاد می‌مانند (تا DB_POOL_TIMEOUT)."""
+    return database.pool_stats()
+
+
 @app.post(
     "/jobs/crawl",
     response_model=JobResponse,
     summary="ثبت یک درخواست جستجوی جدید",
     dependencies=[Depends(RateLimiter(times=2, minutes=1))]  # محدودیت 2 درخواست در دقیقه
 )
-async def submit_crawl_job(request: CrawlRequest):
+async def submit_crawl_job(request: CrawlRequest, http_request: Request):
     """
     [اصلاح] این اندپوینت اکنون فقط درخواست‌های 'wikipedia' را می‌پذیرد (کنترل در ورکر انجام می‌شود).
+    priority=bulk درخواست را به صف جدای crawlهای حجیم می‌فرستد.
     """
     if not arq_pool:
         raise HTTPException(status_code=503, detail="صف کارها در دسترس نیست")
 
-    task_details = request.dict()
-
-    job = await arq_pool.enqueue_job(
-        'run_crawl_task',
-        task_details
+    job_id, status = await enqueue_crawl_job(
+        {"crawler_name": request.crawler_name, "params": request.params},
+        tenant=request_tenant(http_request),
+        priority=request.priority
     )
-    return JobResponse(
-        job_id=job.job_id,
-        status="queued",
-        message=f"درخواست برای '{request.crawler_name}' در صف قرار گرفت."
+
+    messages = {
+        "queued": f"درخواست برای '{request.crawler_name}' در صف قرار گرفت.",
+        "deduplicated": f"درخواست مشابهی برای '{request.crawler_name}' در جریان است؛ به همان متصل شدید.",
+        "cached": f"نتیجه تازه‌ای برای این درخواست '{request.crawler_name}' موجود است.",
+    }
+    return JobResponse(job_id=job_id, status=status, message=messages[status])
+
+
+@app.post(
+    "/jobs/crawl/batch",
+    response_model=BatchResponse,
+    summary="ثبت گروهی چند عبارت جستجو",
+    dependencies=[Depends(RateLimiter(times=2, minutes=1))]
+)
+async def submit_crawl_batch(request: BatchCrawlRequest, http_request: Request):
+    """هر عبارت یک job جداگانه (با همان deduplication اندپوینت تکی) می‌شود؛ پیش‌فرض در صف bulk."""
+    if not arq_pool:
+        raise HTTPException(status_code=503, detail="صف کارها در دسترس نیست")
+
+    terms = list(dict.fromkeys(" ".join(term.split()) for term in request.search_terms if term.strip()))
+    if not terms:
+        raise HTTPException(status_code=400, detail="لیست عبارت‌های جستجو خالی است")
+    if len(terms) > BATCH_MAX_TERMS:
+        raise HTTPException(status_code=400, detail=f"حداکثر {BATCH_MAX_TERMS} عبارت در هر batch مجاز است")
+
+    task_list = [
+        {"crawler_name": request.crawler_name, "params": {**request.params, "search_term": term}}
+        for term in terms
+    ]
+    batch_id = uuid.uuid4().hex
+    job_ids = list(dict.fromkeys(crawl_job_key(normalize_task_details(task)) for task in task_list))
+    # batch پیش از enqueue ثبت می‌شود تا ورکر نتیجه jobهایی را که بلافاصله تمام می‌شوند هم در آن بنویسد
+    async with arq_pool.pipeline(transaction=True) as pipe:
+        pipe.rpush(batch_key(batch_id), *job_ids)
+        pipe.expire(batch_key(batch_id), BATCH_TTL_SECONDS)
+        pipe.hset(batch_results_key(batch_id), BATCH_CREATED_FIELD, time.time())
+        pipe.expire(batch_results_key(batch_id), BATCH_TTL_SECONDS)
+        for job_id in job_ids:
+            pipe.sadd(job_batches_key(job_id), batch_id)
+            pipe.expire(job_batches_key(job_id), BATCH_TTL_SECONDS)
+        await pipe.execute()
+
+    tenant = request_tenant(http_request)
+    outcomes = []
+    for i in range(0, len(task_list), BATCH_ENQUEUE_CONCURRENCY):
+        chunk = task_list[i:i + BATCH_ENQUEUE_CONCURRENCY]
+        outcomes.extend(await asyncio.gather(*(
+            enqueue_crawl_job(task, tenant=tenant, priority=request.priority) for task in chunk
+        )))
+    # نتیجه تازه موجود (cached) همین حالا در batch کپی می‌شود
+    await store_batch_outcomes(batch_id, [job_id for job_id, status in outcomes if status == "cached"])
+
+    statuses = [status for _, status in outcomes]
+    return BatchResponse(
+        batch_id=batch_id,
+        total=len(job_ids),
+        queued=statuses.count("queued"),
+        deduplicated=statuses.count("deduplicated"),
+        cached=statuses.count("cached")
     )
 
 
+@app.get(
+    "/jobs/batch/{batch_id}",
+    response_model=BatchStatus,
+    summary="وضعیت تجمیعی یک batch"
+)
+async def get_batch_status(batch_id: str):
+
+    if not arq_pool:
+        raise HTTPException(status_code=503, detail="صف کارها در دسترس نیست")
+
+    raw_ids = await arq_pool.lrange(batch_key(batch_id), 0, -1)
+    if not raw_ids:
+        raise HTTPException(status_code=404, detail="batch یافت نشد")
+
+    job_ids = [job_id.decode() if isinstance(job_id, bytes) else job_id for job_id in raw_ids]
+    return await collect_batch_status(batch_id, job_ids)
+
+
+@app.get("/jobs/queues", response_model=List[QueueStats], summary="عمق صف‌ها و زمان انتظار هر اولویت")
+async def get_queue_stats():
+    """
+    برای هر اولویت: jobهای منتظر و در حال اجرای صف arq، jobهای در نوبت tenantها (scheduler)
+    و صدک زمان انتظار اخیر از ثبت درخواست تا شروع اجرا (گزارش ورکر).
+    """
+    if not arq_pool or not scheduler:
+        raise HTTPException(status_code=503, detail="صف کارها در دسترس نیست")
+
+    now_ms = time.time() * 1000
+    stats = []
+    for priority, queue_name in JOB_QUEUES.items():
+        waiting, running = await scheduler.queue_jobs(queue_name)
+        waits = [float(value) for value in await redis_client.lrange(queue_waits_key(priority), 0, -1)]
+        pending = await scheduler.stats(priority)
+        cuts = statistics.quantiles(waits, n=100, method="inclusive") if waits else None
+        stats.append(QueueStats(
+            priority=priority,
+            queue_name=queue_name,
+            queued=len(waiting),
+            running=running,
+            oldest_queued_seconds=round(max(0.0, now_ms - waiting[0][1]) / 1000, 3) if waiting else 0.0,
+            worker_alive=await scheduler.has_worker(queue_name),
+            scheduler_pending=pending["pending"],
+            scheduler_pending_by_tenant=pending["pending_by_tenant"],
+            oldest_pending_seconds=pending["oldest_pending_seconds"],
+            recent_wait_p50_seconds=round(cuts[49], 3) if cuts else None,
+            recent_wait_p95_seconds=round(cuts[94], 3) if cuts else None,
+            recent_wait_samples=len(waits)
+        ))
+    return stats
+
+
 @app.get(
     "/jobs/status/{job_id}",
     response_model=JobStatus,
@@ -116,14 +657,37 @@ async def get_job_status(job_id: str):
     if not arq_pool:
         raise HTTPException(status_code=503, detail="صف کارها در دسترس نیست")
 
+    return await read_job_status(job_id)
+
+
+@app.get("/jobs/events/{job_id}", summary="دریافت لحظه‌ای وضعیت یک درخواست (Server-Sent Events)")
+async def stream_job_events(job_id: str):
+    """جایگزین polling: وضعیت فعلی و سپس هر تغییر وضعیت به صورت رویداد SSE ارسال می‌شود."""
+    if not arq_pool or not redis_client:
+        raise HTTPException(status_code=503, detail="صف کارها در دسترس نیست")
+
+    return StreamingResponse(
+        job_event_stream(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def read_job_status(job_id: str) -> JobStatus:
     try:
         job = Job(job_id, arq_pool)
-        status = await job.status()
+        status = await arq_job_status(job_id)
+        if status == ArqJobStatus.not_found and scheduler and await scheduler.is_pending(job_id):
+            # هنوز در نوبت tenant است و به صف arq نرسیده
+            status = ArqJobStatus.deferred
         result = None
         if status == "complete":
             result = await job.result()
         elif status == "failed":
             result = await job.result(exc_deserializer=None)
+        elif status == "in_progress":
+            progress = await arq_pool.get(job_progress_key(job_id))
+            result = json.loads(progress) if progress else None
 
         return JobStatus(status=status, result=result)
 
@@ -132,8 +696,187 @@ async def get_job_status(job_id: str):
 
 
 
-@app.get("/articles", response_model=List[WikipediaArticleSchema], summary="دریافت تمام مقالات ویکی‌پدیا")
-async def get_all_articles(db: AsyncSession = Depends(database.get_async_db)):
-    query = select(database.WikipediaArticle).order_by(database.WikipediaArticle.id.desc())
+@app.get("/articles", response_model=ArticlePage, summary="دریافت صفحه‌ای مقالات ویکی‌پدیا")
+async def get_all_articles(
+        cursor: Optional[int] = Query(None, description="id آخرین مقاله صفحه قبل (next_cursor)"),
+        limit: int = Query(ARTICLE_PAGE_DEFAULT_LIMIT, ge=1, le=ARTICLE_PAGE_MAX_LIMIT),
+        fields: Optional[str] = Query(None, description="لیست ستون‌ها با کاما، مثلا id,title,summary"),
+        db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    صفحه‌بندی keyset روی id (نزولی): هزینه هر صفحه مستقل از اندازه جدول است
+    و full_text هرگز در لیست بارگیری نمی‌شود.
+    """
+    field_names = parse_article_fields(fields)
+    columns = [getattr(database.WikipediaArticle, name) for name in field_names]
+
+    query = select(*columns).order_by(database.WikipediaArticle.id.desc()).limit(limit + 1)
+    if cursor is not None:
+        query = query.where(database.WikipediaArticle.id < cursor)
+
+    result = await db.execute(query)
+    rows = [dict(row) for row in result.mappings().all()]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]["id"]
+
+    return ArticlePage(items=rows, next_cursor=next_cursor)
+
+
+@app.get("/articles/export", summary="خروجی استریم کل مقالات (NDJSON/CSV)")
+async def export_articles(
+        format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+        gzip: bool = Query(False),
+        since_id: int = Query(0, ge=0, description="ادامه خروجی از بعد از این id"),
+        fields: Optional[str] = Query(None, description="لیست ستون‌ها با کاما (پیش‌فرض: همه، شامل full_text)"),
+):
+    """
+    خروجی به ترتیب صعودی id است؛ اگر دانلود قطع شد، با since_id برابر آخرین id
+    دریافت‌شده ادامه دهید.
+    """
+    field_names = parse_article_fields(fields, allowed=ARTICLE_EXPORT_FIELDS)
+    rows = stream_article_rows(field_names, since_id)
+
+    if format == "csv":
+        body = encode_csv(rows, field_names)
+        media_type = "text/csv; charset=utf-8"
+    else:
+        body = encode_ndjson(rows, field_names)
+        media_type = "application/x-ndjson"
+
+    filename = f"wikipedia_articles.{format}"
+    headers = {}
+    if gzip:
+        body = gzip_stream(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+@app.get("/articles/changes", response_model=ArticleChanges, summary="مقالات تغییرکرده برای همگام‌سازی افزایشی")
+async def get_article_changes(
+        since: Optional[datetime] = Query(None, description="updated_at آخرین ردیف دیده‌شده (next_since)"),
+        after_id: int = Query(0, description="id آخرین ردیف دیده‌شده (next_after_id)"),
+        limit: int = Query(ARTICLE_CHANGES_DEFAULT_LIMIT, ge=1, le=ARTICLE_CHANGES_MAX_LIMIT),
+        db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    ردیف‌های درج‌شده یا تغییرکرده به ترتیب (updated_at, id)؛ جفت آخرین ردیف cursor صفحه بعد است.
+    بدون since همه مقالات برگردانده می‌شوند. full_text عمداً حذف شده است.
+    """
+    article = database.WikipediaArticle
+    columns = [getattr(article, name) for name in ARTICLE_LIST_FIELDS] + [article.updated_at]
+
+    query = select(*columns).order_by(article.updated_at, article.id).limit(limit + 1)
+    if since is not None:
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        query = query.where(tuple_(article.updated_at, article.id) > tuple_(since, after_id))
+
+    rows = [dict(row) for row in (await db.execute(query)).mappings().all()]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if not rows:
+        return ArticleChanges(items=[], next_since=since, next_after_id=after_id, has_more=False)
+    return ArticleChanges(
+        items=rows,
+        next_since=rows[-1]["updated_at"],
+        next_after_id=rows[-1]["id"],
+        has_more=has_more
+    )
+
+
+@app.get("/articles/stats", response_model=StorageStats, summary="آمار حجم ذخیره‌سازی مقالات")
+async def get_storage_stats(db: AsyncSession = Depends(database.get_async_db)):
+    """
+    avg_full_text_bytes اندازه خام متن و avg_full_text_stored_bytes اندازه ذخیره‌شده
+    (پس از فشرده‌سازی TOAST) است.
+    """
+    sizes = (await db.execute(text(
+        "SELECT pg_relation_size('wikipedia_articles') AS heap_bytes, "
+        "pg_table_size('wikipedia_articles') - pg_relation_size('wikipedia_articles') AS toast_bytes, "
+        "pg_indexes_size('wikipedia_articles') AS index_bytes, "
+        "pg_total_relation_size('wikipedia_articles') AS total_bytes, "
+        "(SELECT count(*) FROM wikipedia_articles) AS articles"
+    ))).mappings().one()
+
+    sample = (await db.execute(text(
+        "SELECT count(*) AS sampled, "
+        "coalesce(avg(octet_length(full_text)), 0) AS raw_bytes, "
+        "coalesce(avg(pg_column_size(full_text)), 0) AS stored_bytes "
+        "FROM (SELECT full_text FROM wikipedia_articles WHERE full_text IS NOT NULL "
+        "ORDER BY id DESC LIMIT :limit) AS recent"
+    ), {"limit": STORAGE_STATS_SAMPLE_ROWS})).mappings().one()
+
+    raw_bytes = float(sample["raw_bytes"])
+    stored_bytes = float(sample["stored_bytes"])
+    return StorageStats(
+        articles=sizes["articles"],
+        sampled_articles=sample["sampled"],
+        avg_full_text_bytes=raw_bytes,
+        avg_full_text_stored_bytes=stored_bytes,
+        compression_ratio=raw_bytes / stored_bytes if stored_bytes else None,
+        heap_bytes=sizes["heap_bytes"],
+        toast_bytes=sizes["toast_bytes"],
+        index_bytes=sizes["index_bytes"],
+        total_bytes=sizes["total_bytes"],
+        bytes_per_article=sizes["total_bytes"] / sizes["articles"] if sizes["articles"] else 0.0
+    )
+
+
+@app.get("/articles/{pageid}", response_model=WikipediaArticleSchema, summary="دریافت جزئیات و متن کامل یک مقاله")
+async def get_article(pageid: int, db: AsyncSession = Depends(database.get_async_db)):
+    query = (
+        select(database.WikipediaArticle)
+        .options(undefer(database.WikipediaArticle.full_text))
+        .where(database.WikipediaArticle.pageid == pageid)
+    )
+    result = await db.execute(query)
+    article = result.scalar_one_or_none()
+    if article is None:
+        raise HTTPException(status_code=404, detail="مقاله یافت نشد")
+    return article
+
+
+@app.get("/search", response_model=SearchPage, summary="جستجوی تمام‌متن در مقالات ذخیره‌شده")
+async def search_articles(
+        q: str = Query(..., min_length=1, description="عبارت جستجو (نحو websearch: \"عبارت\"، OR، -کلمه)"),
+        page: int = Query(1, ge=1),
+        limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+        db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    رتبه‌بندی با ts_rank_cd روی ایندکس GIN؛ snippet فقط برای ردیف‌های همین صفحه ساخته می‌شود.
+    """
+    article = database.WikipediaArticle
+    ts_query = func.websearch_to_tsquery(database.SEARCH_CONFIG, q)
+    rank = func.ts_rank_cd(article.search_vector, ts_query)
+
+    ranked = (
+        select(article.id, rank.label("rank"))
+        .where(article.search_vector.op("@@")(ts_query))
+        .order_by(rank.desc(), article.id.desc())
+        .limit(limit + 1)
+        .offset((page - 1) * limit)
+        .subquery()
+    )
+    headline_source = func.coalesce(
+        func.left(article.full_text, SEARCH_HEADLINE_CHARS),
+        article.summary,
+        ""
+    )
+    snippet = func.ts_headline(database.SEARCH_CONFIG, headline_source, ts_query, SEARCH_HEADLINE_OPTIONS)
+    query = (
+        select(article.id, article.pageid, article.title, article.url, ranked.c.rank, snippet.label("snippet"))
+        .join(ranked, ranked.c.id == article.id)
+        .order_by(ranked.c.rank.desc(), article.id.desc())
+    )
+
     result = await db.execute(query)
-    return result.scalars().all()
\ No newline at end of file
+    rows = [SearchResult(**row) for row in result.mappings().all()]
+    return SearchPage(items=rows[:limit], page=page, limit=limit, has_more=len(rows) > limit)
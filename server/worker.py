@@ -1,45 +1,228 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
 import redis.asyncio as redis
+from arq import cron
 from arq.connections import RedisSettings
+from arq.constants import default_queue_name
+from prometheus_client import start_http_server
+from sqlalchemy import Integer, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from shared.database import AsyncSessionLocal, WikipediaArticle, dispose_engines, pool_stats
+from .crawler import WikipediaCrawler, DataSaverAsync, create_http_client
+from .frontier import ShardQueue
+from .http_cache import MemoryResponseCache, RedisResponseCache
+from .metrics import ERRORS, observe_job_run, observe_queue_wait, register_db_pool_metrics
+from .parsing import parse_timestamp
+from .ratelimit import RateLimiterRegistry
+
+
+JOB_PROGRESS_TTL_SECONDS = 3600
+
+# صف جدا برای هر اولویت تا crawlهای حجیم جستجوهای تعاملی را پشت سر خود نگه ندارند.
+# صف تعاملی همان صف پیش‌فرض arq است؛ صف bulk (و refresh دوره‌ای) را BulkWorkerSettings می‌خواند.
+INTERACTIVE_QUEUE_NAME = default_queue_name
+BULK_QUEUE_NAME = f"{default_queue_name}:bulk"
+JOB_QUEUES = {"interactive": INTERACTIVE_QUEUE_NAME, "bulk": BULK_QUEUE_NAME}
+# اگر ورکر bulk در حال اجرا نباشد، jobهای bulk فقط هنگام بیکاری صف تعاملی یکی‌یکی به آن فرستاده می‌شوند
+QUEUE_FALLBACKS = {"bulk": "interactive"}
+# کلید health-check ورکرها با این فاصله تمدید می‌شود؛ نبود ورکر bulk حداکثر پس از همین مدت تشخیص داده می‌شود
+WORKER_HEALTH_CHECK_INTERVAL = 60
+# زمان‌های اخیر انتظار (از ثبت درخواست تا شروع اجرا) برای /jobs/queues
+QUEUE_WAIT_SAMPLES = 200
+
+
+def queue_waits_key(priority: str) -> str:
+    return f"crawl_queue_waits:{priority}"
+
+
+# batchها 24 ساعت نگه داشته می‌شوند؛ نتیجه arq فقط keep_result (یک ساعت) می‌ماند و با اجرای دوباره
+# همان job حذف می‌شود، پس نتیجه هر job در hash خود batch هم ثبت می‌شود
+BATCH_TTL_SECONDS = 24 * 3600
+
+# ثبت نتیجه job در hash هر batch که هنوز منقضی نشده است (بدون ساختن کلید بی‌TTL)
+RECORD_BATCH_RESULT_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('HSET', key, ARGV[1], ARGV[2])
+    end
+end
+return 0
+"""
+
+
+def batch_key(batch_id: str) -> str:
+    return f"crawl_batch:{batch_id}"
+
 
-from shared.database import AsyncSessionLocal, WikipediaArticle
-from .crawler import WikipediaCrawler, DataSaverAsync
+def batch_results_key(batch_id: str) -> str:
+    return f"crawl_batch:{batch_id}:results"
+
+
+def job_batches_key(job_id: str) -> str:
+    return f"crawl_job_batches:{job_id}"
+
+
+def job_events_channel(job_id: str) -> str:
+    return f"crawl_job_events:{job_id}"
+
+
+def job_progress_key(job_id: str) -> str:
+    return f"crawl_job_progress:{job_id}"
+
+
+async def report_progress(ctx, progress: dict):
+    """پیشرفت job را برای /jobs/status ذخیره و برای SSE منتشر می‌کند."""
+    try:
+        await ctx['redis'].set(job_progress_key(ctx['job_id']), json.dumps(progress), ex=JOB_PROGRESS_TTL_SECONDS)
+    except Exception as e:
+        print(f"Could not store progress for job {ctx['job_id']}: {e}")
+    await publish_job_event(ctx, "in_progress", progress)
+
+
+async def publish_job_event(ctx, status: str, result: dict | None = None):
+    """تغییر وضعیت job را روی Redis pub/sub منتشر می‌کند (برای SSE سرور)."""
+    try:
+        payload = json.dumps({"job_id": ctx['job_id'], "status": status, "result": result}, ensure_ascii=False)
+        await ctx['redis'].publish(job_events_channel(ctx['job_id']), payload)
+    except Exception as e:
+        print(f"Could not publish event for job {ctx['job_id']}: {e}")
+
+
+async def record_queue_wait(ctx, task_details: dict):
+    """کل زمان انتظار (شامل نوبت scheduler پیش از ورود به صف arq) را در یک لیست محدود نگه می‌دارد."""
+    submitted_at = task_details.get("submitted_at")
+    if submitted_at is None:
+        return
+    key = queue_waits_key(task_details.get("priority", "interactive"))
+    try:
+        async with ctx['redis'].pipeline(transaction=False) as pipe:
+            pipe.lpush(key, round(max(0.0, time.time() - submitted_at), 3))
+            pipe.ltrim(key, 0, QUEUE_WAIT_SAMPLES - 1)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Could not record queue wait for job {ctx['job_id']}: {e}")
+
+
+async def record_batch_results(ctx, result: dict):
+    """نتیجه job را در hash همه batchهایی که شامل آن هستند ثبت می‌کند."""
+    try:
+        batch_ids = await ctx['redis'].smembers(job_batches_key(ctx['job_id']))
+        if batch_ids:
+            keys = [
+                batch_results_key(batch_id.decode() if isinstance(batch_id, bytes) else batch_id)
+                for batch_id in batch_ids
+            ]
+            await ctx['redis'].eval(
+                RECORD_BATCH_RESULT_SCRIPT, len(keys), *keys, ctx['job_id'], json.dumps(result, ensure_ascii=False)
+            )
+    except Exception as e:
+        print(f"Could not record batch result for job {ctx['job_id']}: {e}")
 
 
 async def run_crawl_task(ctx, task_details: dict):
     """تابع اصلی اجرای تسک در ورکر."""
+    observe_queue_wait(ctx, "run_crawl_task")
+    await record_queue_wait(ctx, task_details)
+    started = time.perf_counter()
+    await publish_job_event(ctx, "in_progress")
+    result = await execute_crawl(ctx, task_details)
+    observe_job_run("run_crawl_task", result, started)
+    await record_batch_results(ctx, result)
+    await publish_job_event(ctx, "complete", result)
+    return result
+
+
+async def find_fresh_pages(items: list[dict]) -> set[int]:
+    """
+    pageid صفحاتی که متن کاملشان ذخیره شده و از آخرین ویرایش (timestamp نتیجه جستجو) قدیمی‌تر
+    نیستند؛ با یک کوئری ANY برای کل دسته. صفحات بدون timestamp (گسترش پیوندها) با وجود داشتن تازه
+    حساب می‌شوند و به‌روزرسانی آن‌ها با refresh_changed_articles است.
+    """
+    edited_at = {item["pageid"]: parse_timestamp(item.get("timestamp")) for item in items}
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(WikipediaArticle.pageid, WikipediaArticle.touched)
+            .where(WikipediaArticle.pageid == any_(bindparam("page_ids", list(edited_at), type_=ARRAY(Integer))))
+            .where(WikipediaArticle.full_text.is_not(None))
+        )).all()
+    return {
+        row.pageid for row in rows
+        if edited_at[row.pageid] is None or (row.touched is not None and row.touched >= edited_at[row.pageid])
+    }
+
+
+def build_crawler(ctx, crawler_name: str, params: dict):
+    """کراولر و مدل مقصد را بر اساس نام کراولر می‌سازد."""
+    if crawler_name == "wikipedia":
+        search_term = params.get("search_term")
+        if not search_term:
+            raise ValueError("search_term (عبارت جستجو) الزامی است")
+        max_results = params.get("max_results", 20)
+        crawler_instance = WikipediaCrawler(
+            search_term=search_term,
+            max_results=max_results,
+            cache=ctx.get('http_cache'),
+            client=ctx.get('http_client'),
+            rate_limiters=ctx.get('rate_limiters'),
+            expand_depth=params.get("expand_depth", 0),
+            max_pages=params.get("max_pages"),
+            link_direction=params.get("link_direction", "links"),
+            base_url=WIKIPEDIA_BASE_URL,
+            concurrency_limit=CRAWL_JOB_CONCURRENCY,
+            parse_executor=ctx.get('parse_executor'),
+            parse_offload_threshold=PARSE_OFFLOAD_THRESHOLD,
+            # skip_known=False همه صفحات را دوباره واکشی می‌کند
+            known_pages_filter=find_fresh_pages if params.get("skip_known", True) else None
+        )
+        return crawler_instance, WikipediaArticle
+
+    raise ValueError(f"کراولر ناشناخته: {crawler_name}")
+
+
+async def execute_crawl(ctx, task_details: dict) -> dict:
     crawler_name = task_details.get("crawler_name")
     params = task_details.get("params", {})
 
     print(f"Worker received job: {ctx['job_id']} for crawler: {crawler_name} with params: {params}")
 
     crawler_instance = None
-    model_class = None
 
     try:
+        crawler_instance, model_class = build_crawler(ctx, crawler_name, params)
 
-        if crawler_name == "wikipedia":
-            search_term = params.get("search_term")
-            if not search_term:
-                raise ValueError("search_term (عبارت جستجو) الزامی است")
-            crawler_instance = WikipediaCrawler(search_term=search_term)
-            model_class = WikipediaArticle
-
-        else:
-            raise ValueError(f"کراولر ناشناخته: {crawler_name}")
-
+        if params.get("distributed"):
+            return await execute_sharded_crawl(ctx, task_details, crawler_instance, model_class)
 
         async with AsyncSessionLocal() as db:
 
-            items = await crawler_instance.run()
-            if items:
-                saver = DataSaverAsync(db_session=db)
-                count = await saver.save_items(items, model_class)
-                return {"status": "success", "found": len(items), "saved": count}
-            else:
-                return {"status": "success", "found": 0, "saved": 0}
+            # هر دسته به محض آماده شدن ذخیره می‌شود؛ کل نتایج هرگز هم‌زمان در حافظه نیستند
+            saver = DataSaverAsync(db_session=db)
+            progress = {"found": 0, "saved": 0, "skipped": 0, "batches_done": 0, "batches_total": 0}
+            async for batch in crawler_instance.iter_batches():
+                progress["found"] += len(batch)
+                progress["saved"] += await saver.save_items(batch, model_class, mode="update")
+                progress["skipped"] = crawler_instance.pages_skipped
+                progress["batches_done"] += 1
+                progress["batches_total"] = crawler_instance.batches_total
+                await report_progress(ctx, progress)
+
+            return {
+                "status": "success",
+                "found": progress["found"],
+                "saved": progress["saved"],
+                "skipped": crawler_instance.pages_skipped,
+            }
 
     except Exception as e:
         print(f"Job {ctx['job_id']} failed: {e}")
+        ERRORS.labels("job", type(e).__name__).inc()
         return {"status": "failed", "error": str(e)}
 
     finally:
@@ -48,26 +231,367 @@ async def run_crawl_task(ctx, task_details: dict):
         print(f"Worker finished job: {ctx['job_id']}")
 
 
+async def execute_sharded_crawl(ctx, task_details: dict, crawler_instance, model_class) -> dict:
+    """
+    نتایج جستجو و سپس صفحات هر سطح گسترش پیوندها (expand_depth) به دسته‌های pageid در یک
+    ShardQueue مشترک تقسیم می‌شوند. هر سطح تا کامل شدن بین ورکرها پخش می‌شود و بعد سطح
+    بعدی از پیوندهای همان صفحات ساخته می‌شود.
+    """
+    search_results = await crawler_instance.search()
+    if not search_results:
+        return {"status": "success", "found": 0, "saved": 0, "skipped": crawler_instance.pages_skipped}
+
+    crawl_id = f"{ctx['job_id']}:{uuid.uuid4().hex[:8]}"
+    queue = ShardQueue(ctx['redis'], crawl_id, lease_seconds=SHARD_LEASE_SECONDS)
+
+    # مثل iter_batches: گسترش از همه نتایج جستجو، حتی صفحاتی که جزئیاتشان دوباره واکشی نمی‌شود
+    seed_ids = [item["pageid"] for item in search_results]
+    await shard_level(ctx, queue, crawl_id, task_details, crawler_instance, model_class,
+                      await crawler_instance.drop_known_pages(search_results))
+    if crawler_instance.expand_depth:
+        async for _, pending in crawler_instance.iter_expansion_levels(seed_ids):
+            await shard_level(ctx, queue, crawl_id, task_details, crawler_instance, model_class, pending)
+
+    stats = await queue.stats()
+    return {
+        "status": "success",
+        "found": stats["found"],
+        "saved": stats["saved"],
+        "skipped": crawler_instance.pages_skipped,
+        "shards": stats["batches_total"],
+    }
+
+
+async def shard_level(ctx, queue: ShardQueue, crawl_id: str, task_details: dict,
+                      crawler_instance, model_class, items: list[dict]):
+    """
+    آیتم‌های یک سطح را به صف مشترک اضافه می‌کند، تسک‌های کمکی run_crawl_shard_task را در صف
+    می‌گذارد و خودش هم دسته برمی‌دارد تا صف (از جمله دسته‌های ورکرهای مرده) خالی شود.
+    """
+    if not items:
+        return
+    batch_size = crawler_instance.DETAILS_GROUP_SIZE
+    batches = []
+    for i in range(0, len(items), batch_size):
+        chunk = items[i:i + batch_size]
+        batches.append({
+            "pageids": [item["pageid"] for item in chunk],
+            "items": {str(item["pageid"]): item for item in chunk},
+        })
+    await queue.push_batches(batches)
+
+    # تسک‌های کمکی با خالی شدن صف تمام می‌شوند، پس برای هر سطح دوباره در صف قرار می‌گیرند
+    helpers = min(SHARD_HELPERS, len(batches) - 1)
+    for _ in range(helpers):
+        await ctx['arq_pool'].enqueue_job('run_crawl_shard_task', crawl_id, task_details)
+    print(f"Job {ctx['job_id']} split {len(items)} pages into {len(batches)} shards ({helpers} helper tasks).")
+
+    async def on_batch_done():
+        await report_progress(ctx, await queue.stats())
+
+    while True:
+        await process_shards(queue, crawler_instance, model_class, on_batch_done)
+        if await queue.is_finished():
+            break
+        # دسته‌های باقی‌مانده در دست ورکرهای دیگرند؛ اگر lease آن‌ها منقضی شود دوباره برداشته می‌شوند
+        await asyncio.sleep(SHARD_POLL_SECONDS)
+
+
+async def process_shards(queue: ShardQueue, crawler_instance, model_class, on_batch_done=None) -> int:
+    """
+    چند حلقه هم‌زمان (هر کدام با سشن دیتابیس خودش) تا خالی شدن صف دسته برمی‌دارند. اگر یکی خطا دهد
+    بقیه لغو می‌شوند تا heartbeat دسته‌هایشان قطع شود و پس از انقضای lease ورکرهای دیگر آن‌ها را بردارند.
+    """
+    tasks = [
+        asyncio.create_task(claim_shards(queue, crawler_instance, model_class, on_batch_done))
+        for _ in range(crawler_instance.concurrency_limit)
+    ]
+    try:
+        counts = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return sum(counts)
+
+
+async def claim_shards(queue: ShardQueue, crawler_instance, model_class, on_batch_done=None) -> int:
+    processed = 0
+    async with AsyncSessionLocal() as db:
+        saver = DataSaverAsync(db_session=db)
+        while (claimed := await queue.claim()) is not None:
+            lease, batch = claimed
+            heartbeat = asyncio.create_task(keep_lease_alive(queue, lease))
+            try:
+                items_by_id = {int(page_id): item for page_id, item in batch["items"].items()}
+                articles = await crawler_instance.complete_batch(batch["pageids"], items_by_id)
+                saved = await saver.save_items(articles, model_class, mode="update")
+            finally:
+                heartbeat.cancel()
+
+            await queue.complete(lease, found=len(articles), saved=saved)
+            processed += 1
+            if on_batch_done:
+                await on_batch_done()
+    return processed
+
+
+async def keep_lease_alive(queue: ShardQueue, lease: str):
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        await queue.heartbeat(lease)
+
+
+async def run_crawl_shard_task(ctx, crawl_id: str, task_details: dict):
+    """تسک کمکی: از صف مشترک یک crawl بزرگ دسته برمی‌دارد تا صف خالی شود."""
+    observe_queue_wait(ctx, "run_crawl_shard_task")
+    started = time.perf_counter()
+    crawler_instance = None
+    try:
+        crawler_instance, model_class = build_crawler(
+            ctx, task_details.get("crawler_name"), task_details.get("params", {})
+        )
+        queue = ShardQueue(ctx['redis'], crawl_id, lease_seconds=SHARD_LEASE_SECONDS)
+        processed = await process_shards(queue, crawler_instance, model_class)
+        print(f"Shard worker {ctx['job_id']} processed {processed} batches of {crawl_id}.")
+        result = {"status": "success", "batches": processed}
+
+    except Exception as e:
+        print(f"Shard job {ctx['job_id']} failed: {e}")
+        ERRORS.labels("job", type(e).__name__).inc()
+        result = {"status": "failed", "error": str(e)}
+
+    finally:
+        if crawler_instance:
+            await crawler_instance.close()
+
+    observe_job_run("run_crawl_shard_task", result, started)
+    return result
+
+
+async def refresh_changed_articles(ctx):
+    """
+    تسک دوره‌ای: lastrevid صفحات ذخیره‌شده را دسته‌ای (فقط prop=info) بررسی می‌کند و
+    متن را فقط برای صفحاتی که revision جدید دارند دوباره واکشی می‌کند.
+    پیمایش جدول از cursor ذخیره‌شده در Redis ادامه می‌یابد و پیش از پایان بازه/timeout متوقف
+    می‌شود، پس روی جدول بزرگ چند اجرای پیاپی کل جدول را پوشش می‌دهند.
+    """
+    observe_queue_wait(ctx, "refresh_changed_articles")
+    started = time.perf_counter()
+    # کش پاسخ عمداً استفاده نمی‌شود تا revisionها و متن‌ها تازه باشند
+    crawler_instance = WikipediaCrawler(
+        client=ctx.get('http_client'),
+        rate_limiters=ctx.get('rate_limiters'),
+        base_url=WIKIPEDIA_BASE_URL,
+        concurrency_limit=CRAWL_JOB_CONCURRENCY,
+        parse_executor=ctx.get('parse_executor'),
+        parse_offload_threshold=PARSE_OFFLOAD_THRESHOLD
+    )
+    last_id = int(await ctx['redis'].get(REFRESH_CURSOR_KEY) or 0)
+    stats = {"checked": 0, "changed": 0, "saved": 0, "resumed_from": last_id, "completed_pass": False,
+             "save_failed": False}
+    deadline = time.monotonic() + REFRESH_MAX_RUN_SECONDS
+
+    try:
+        async with AsyncSessionLocal() as db:
+            saver = DataSaverAsync(db_session=db)
+            while time.monotonic() < deadline:
+                rows = (await db.execute(
+                    select(WikipediaArticle.id, WikipediaArticle.pageid, WikipediaArticle.title,
+                           WikipediaArticle.summary, WikipediaArticle.lastrevid)
+                    .where(WikipediaArticle.id > last_id)
+                    .order_by(WikipediaArticle.id)
+                    .limit(REFRESH_SCAN_BATCH)
+                )).all()
+                if not rows:
+                    # پایان جدول: اجرای بعدی از ابتدا شروع می‌کند
+                    await ctx['redis'].delete(REFRESH_CURSOR_KEY)
+                    stats["completed_pass"] = True
+                    break
+
+                stored = {row.pageid: row for row in rows}
+                revisions = await crawler_instance.fetch_revisions(list(stored))
+                stats["checked"] += len(rows)
+
+                items_by_id = {
+                    page_id: {"pageid": page_id, "title": stored[page_id].title, "summary": stored[page_id].summary}
+                    for page_id, revision in revisions.items()
+                    if revision != stored[page_id].lastrevid
+                }
+                stats["changed"] += len(items_by_id)
+                failures_before = saver.failed_saves
+                if items_by_id:
+                    async for batch in crawler_instance.iter_detail_batches(items_by_id):
+                        stats["saved"] += await saver.save_items(batch, WikipediaArticle, mode="update")
+                if saver.failed_saves > failures_before:
+                    # cursor جلو نمی‌رود تا اجرای بعدی همین دسته را دوباره بررسی کند
+                    stats["save_failed"] = True
+                    break
+                # پس از ذخیره دسته؛ اجرای قطع‌شده حداکثر همین دسته را دوباره بررسی می‌کند
+                last_id = rows[-1].id
+                await ctx['redis'].set(REFRESH_CURSOR_KEY, last_id)
+
+        print(f"Refresh finished: {stats}")
+        observe_job_run("refresh_changed_articles", {"status": "failed" if stats["save_failed"] else "success"}, started)
+        return stats
+
+    except Exception:
+        observe_job_run("refresh_changed_articles", {"status": "failed"}, started)
+        raise
+
+    finally:
+        await crawler_instance.close()
+
+
 REDIS_HOST = "127.0.0.1"
 REDIS_PORT = 6379
 redis_settings = RedisSettings(host=REDIS_HOST, port=REDIS_PORT)
 
+# crawl توزیع‌شده (params.distributed): تعداد تسک‌های کمکی و مدت lease هر دسته
+SHARD_HELPERS = int(os.getenv("CRAWL_SHARD_HELPERS", "4"))
+SHARD_LEASE_SECONDS = float(os.getenv("CRAWL_SHARD_LEASE_SECONDS", "60"))
+SHARD_POLL_SECONDS = 1.0
+CRAWL_JOB_TIMEOUT = int(os.getenv("CRAWL_JOB_TIMEOUT", "1800"))
+
+# بررسی دوره‌ای تغییرات: هر REFRESH_INTERVAL_MINUTES دقیقه (0 = غیرفعال). زمان‌بندی cron بر اساس
+# دقیقه ساعت است، پس مقدار باید مقسوم‌علیه 60 باشد؛ مقدار دیگر به نزدیک‌ترین مقسوم‌علیه کوچک‌تر گرد می‌شود
+REFRESH_INTERVAL_MINUTES = int(os.getenv("REFRESH_INTERVAL_MINUTES", "60"))
+REFRESH_SCAN_BATCH = 500
+REFRESH_CURSOR_KEY = "refresh_changed_articles:cursor"
+
+
+def refresh_cron_interval(interval: int) -> int:
+    """فاصله واقعی cron: فقط مقسوم‌علیه‌های 60 (حداکثر 60) فاصله یکنواخت دارند."""
+    valid = max(divisor for divisor in range(1, min(interval, 60) + 1) if 60 % divisor == 0)
+    if valid != interval:
+        print(f"REFRESH_INTERVAL_MINUTES={interval} does not divide 60; refreshing every {valid} minutes instead.")
+    return valid
+
+
+REFRESH_CRON_INTERVAL = refresh_cron_interval(REFRESH_INTERVAL_MINUTES) if REFRESH_INTERVAL_MINUTES > 0 else 0
+# هر اجرا پیش از timeout job و پیش از نوبت بعدی cron متوقف می‌شود (cursor در Redis می‌ماند)
+REFRESH_MAX_RUN_SECONDS = 0.9 * min(CRAWL_JOB_TIMEOUT, max(REFRESH_CRON_INTERVAL, 1) * 60)
+
+# کش پاسخ‌های HTTP: redis (مشترک بین ورکرها)، memory (درون ورکر) یا none
+HTTP_CACHE_BACKEND = os.getenv("HTTP_CACHE_BACKEND", "redis")
+HTTP_CACHE_MAX_AGE = float(os.getenv("HTTP_CACHE_MAX_AGE", "3600"))
+HTTP_CACHE_MAX_STALE = float(os.getenv("HTTP_CACHE_MAX_STALE", "86400"))
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "5000"))
+# سقف حجم کل کش و بزرگ‌ترین پاسخ قابل کش (بایت)؛ متن کامل هر مقاله می‌تواند چند مگابایت باشد
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+HTTP_CACHE_MAX_BODY_BYTES = int(os.getenv("HTTP_CACHE_MAX_BODY_BYTES", str(1024 * 1024)))
+
+# connection pool مشترک همه jobهای یک ورکر
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+# آدرس API ویکی‌پدیا (برای بنچمارک با شبیه‌ساز محلی قابل تغییر است)
+WIKIPEDIA_BASE_URL = os.getenv("WIKIPEDIA_BASE_URL", WikipediaCrawler.DEFAULT_BASE_URL)
+# حداکثر درخواست هم‌زمان هر job
+CRAWL_JOB_CONCURRENCY = int(os.getenv("CRAWL_JOB_CONCURRENCY", "5"))
+
+# پارس پاسخ‌های بزرگ (JSON و متن) در پردازه‌های جدا تا event loop ورکر آزاد بماند.
+# PARSE_PROCESSES=0 یعنی thread pool پیش‌فرض؛ پاسخ‌های کوچک‌تر از آستانه (کاراکتر) درجا پارس می‌شوند
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", str(min(4, os.cpu_count() or 1))))
+PARSE_OFFLOAD_THRESHOLD = int(os.getenv("PARSE_OFFLOAD_THRESHOLD", str(WikipediaCrawler.PARSE_OFFLOAD_THRESHOLD)))
+
+# پورت HTTP متریک‌های Prometheus این ورکر (0 = غیرفعال)؛ برای چند ورکر روی یک میزبان پورت جدا بدهید
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))
+
+# محدودیت نرخ هر میزبان، مشترک بین همه jobهای این ورکر
+CRAWL_RATE_PER_SECOND = float(os.getenv("CRAWL_RATE_PER_SECOND", "10"))
+CRAWL_BURST = int(os.getenv("CRAWL_BURST", "10"))
+CRAWL_MIN_CONCURRENCY = int(os.getenv("CRAWL_MIN_CONCURRENCY", "1"))
+CRAWL_MAX_CONCURRENCY = int(os.getenv("CRAWL_MAX_CONCURRENCY", "10"))
+# بعد از این تعداد خطای پیاپی (5xx یا خطای اتصال) هم‌زمانی میزبان نصف می‌شود
+CRAWL_ERROR_THRESHOLD = int(os.getenv("CRAWL_ERROR_THRESHOLD", "3"))
+
+
+def create_http_cache(redis_client):
+    options = dict(
+        max_age=HTTP_CACHE_MAX_AGE,
+        max_stale=HTTP_CACHE_MAX_STALE,
+        max_entries=HTTP_CACHE_MAX_ENTRIES,
+        max_bytes=HTTP_CACHE_MAX_BYTES,
+        max_body_bytes=HTTP_CACHE_MAX_BODY_BYTES
+    )
+    if HTTP_CACHE_BACKEND == "redis":
+        return RedisResponseCache(redis_client, **options)
+    if HTTP_CACHE_BACKEND == "memory":
+        return MemoryResponseCache(**options)
+    return None
+
 
 async def startup(ctx):
     """تابع راه‌اندازی ورکر."""
     print(f"ARQ Worker starting up, connecting to Redis at {REDIS_HOST}:{REDIS_PORT}...")
+    # arq پیش از startup اتصال خودش (ArqRedis) را در ctx['redis'] می‌گذارد؛ برای enqueue نگه داشته می‌شود
+    ctx['arq_pool'] = ctx['redis']
     ctx['redis'] = await redis.from_url(f"redis://{REDIS_HOST}:{REDIS_PORT}")
+    ctx['http_cache'] = create_http_cache(ctx['redis'])
+    print(f"HTTP response cache: {HTTP_CACHE_BACKEND}.")
+    ctx['http_client'] = create_http_client(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        timeout=HTTP_TIMEOUT
+    )
+    print(f"Shared HTTP/2 client created (max connections: {HTTP_MAX_CONNECTIONS}).")
+    ctx['rate_limiters'] = RateLimiterRegistry(
+        rate=CRAWL_RATE_PER_SECOND,
+        burst=CRAWL_BURST,
+        min_concurrency=CRAWL_MIN_CONCURRENCY,
+        max_concurrency=CRAWL_MAX_CONCURRENCY,
+        error_threshold=CRAWL_ERROR_THRESHOLD
+    )
+    if PARSE_PROCESSES > 0:
+        # forkserver: fork مستقیم از پردازه‌ای که thread و event loop دارد امن نیست
+        ctx['parse_executor'] = ProcessPoolExecutor(
+            max_workers=PARSE_PROCESSES,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+        print(f"Parse process pool created ({PARSE_PROCESSES} processes, threshold {PARSE_OFFLOAD_THRESHOLD} chars).")
+    if WORKER_METRICS_PORT:
+        try:
+            register_db_pool_metrics(pool_stats)
+            start_http_server(WORKER_METRICS_PORT)
+            print(f"Prometheus metrics exposed on :{WORKER_METRICS_PORT}/metrics.")
+        except OSError as e:
+            print(f"Could not start metrics server on port {WORKER_METRICS_PORT}: {e}")
     print("ARQ Worker started successfully.")
 
 
 async def shutdown(ctx):
     print("ARQ Worker shutting down...")
+    if ctx.get('http_client'):
+        await ctx['http_client'].aclose()
+    if ctx.get('parse_executor'):
+        ctx['parse_executor'].shutdown(cancel_futures=True)
+    await dispose_engines()
     await ctx['redis'].close()
 
 
 
 class WorkerSettings:
-    functions = [run_crawl_task]
+    """ورکر صف تعاملی: arq server.worker.WorkerSettings"""
+    functions = [run_crawl_task, run_crawl_shard_task]
+    cron_jobs = []
+    job_timeout = CRAWL_JOB_TIMEOUT
     on_startup = startup
     on_shutdown = shutdown
-    redis_settings = redis_settings
\ No newline at end of file
+    redis_settings = redis_settings
+    queue_name = INTERACTIVE_QUEUE_NAME
+    health_check_interval = WORKER_HEALTH_CHECK_INTERVAL
+
+
+class BulkWorkerSettings(WorkerSettings):
+    """
+    ورکر صف bulk و refresh دوره‌ای کل مقالات: arq server.worker.BulkWorkerSettings (با WORKER_METRICS_PORT جدا).
+    در پردازه جدا اجرا می‌شود تا slotها و محدودیت نرخ ورکر تعاملی را مصرف نکند.
+    """
+    cron_jobs = [
+        cron(refresh_changed_articles, minute=set(range(0, 60, REFRESH_CRON_INTERVAL)))
+    ] if REFRESH_CRON_INTERVAL else []
+    queue_name = BULK_QUEUE_NAME
\ No newline at end of file
@@ -1,8 +1,10 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text
-from sqlalchemy.engine.url import URL
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import uuid
+from sqlalchemy import create_engine, func, BigInteger, Column, Computed, DateTime, Index, Integer, String, Text, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.engine.url import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncAttrs
+from sqlalchemy.orm import sessionmaker, DeclarativeBase, deferred
 from dotenv import load_dotenv
 
 
@@ -11,21 +13,109 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("No DATABASE_URL found in .env file")
 
+# نشانی اختیاری replica فقط‌خواندنی؛ endpointهای خواندنی API از آن استفاده می‌کنند و نوشتن‌ها روی primary می‌مانند
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# تنظیمات pool (برای هر پردازه و هر engine جداگانه): حداکثر اتصال = DB_POOL_SIZE + DB_MAX_OVERFLOW
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", str(DB_MAX_OVERFLOW)))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# اتصال‌های قدیمی‌تر از این (ثانیه) بازسازی می‌شوند؛ -1 یعنی هرگز
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+# کش prepared statement (asyncpg و dialect SQLAlchemy)؛ پشت pgbouncer در حالت transaction باید 0 باشد.
+# با 0 هر prepared statement نام یکتا می‌گیرد تا با statementهای اتصال‌های دیگر روی همان backend تداخل نکند
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+
+def pool_options(pool_size: int, max_overflow: int) -> dict:
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def create_async_engine_from_url(url: str, pool_size: int, max_overflow: int):
+    async_url = make_url(url.replace("postgresql://", "postgresql+asyncpg://")).update_query_dict(
+        {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+    )
+    connect_args = {"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    if DB_STATEMENT_CACHE_SIZE == 0:
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    return create_async_engine(async_url, connect_args=connect_args, **pool_options(pool_size, max_overflow))
+
+
 # اتصال آسنکرون (برای FastAPI و ARQ)
 ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
-AsyncEngine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncEngine = create_async_engine_from_url(DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW)
 AsyncSessionLocal = async_sessionmaker(bind=AsyncEngine, expire_on_commit=False)
 
+# خواندن‌های API (get_async_db و خروجی استریم): بدون DATABASE_READ_URL یک pool جدا روی همان primary،
+# تا ترافیک خواندنی و نوشتن‌های پرحجم اتصال‌های یکدیگر را نگیرند
+AsyncReadEngine = create_async_engine_from_url(DATABASE_READ_URL or DATABASE_URL, DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW)
+AsyncReadSessionLocal = async_sessionmaker(bind=AsyncReadEngine, expire_on_commit=False)
+
 # اتصال سنکرون (برای کلاینت Tkinter)
-SyncEngine = create_engine(DATABASE_URL)
+SyncEngine = create_engine(DATABASE_URL, **pool_options(DB_POOL_SIZE, DB_MAX_OVERFLOW))
 SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=SyncEngine)
 
 
-
-class Base(DeclarativeBase):
+def pool_stats() -> dict:
+    """
+    وضعیت pool هر engine آسنکرون (کلید: نقش write/read)؛ saturation نسبت اتصال‌های در حال استفاده به سقف pool است.
+    آدرس engine عمداً برگردانده نمی‌شود چون /db/pool بدون احراز هویت است.
+    """
+    stats = {}
+    for name, engine, size, overflow in (
+        ("write", AsyncEngine, DB_POOL_SIZE, DB_MAX_OVERFLOW),
+        ("read", AsyncReadEngine, DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW),
+    ):
+        pool = engine.pool
+        checked_out = pool.checkedout()
+        capacity = size + max(0, overflow)
+        stats[name] = {
+            "pool_size": size,
+            "max_overflow": overflow,
+            "checked_out": checked_out,
+            "checked_in": pool.checkedin(),
+            # تعداد اتصال‌های باز بیش از pool_size (می‌تواند منفی باشد وقتی pool هنوز پر نشده)
+            "overflow": pool.overflow(),
+            "saturation": round(checked_out / capacity, 3) if capacity > 0 else 0.0,
+        }
+    return stats
+
+
+
+class Base(AsyncAttrs, DeclarativeBase):
 
     __unique_constraint_column__ = None
+    # ستون‌هایی که content_hash از روی آن‌ها ساخته می‌شود (برای upsert فقط در صورت تغییر)
+    __content_hash_fields__ = ()
+    # ستون‌های نسخه (مثل شماره revision) که تغییرشان هم باعث به‌روزرسانی ردیف می‌شود
+    __version_fields__ = ()
+
+
 
+# بردار جستجوی تمام‌متن؛ عنوان وزن بیشتری از خلاصه و متن کامل دارد
+SEARCH_CONFIG = "english"
+SEARCH_VECTOR_EXPRESSION = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(summary, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(full_text, '')), 'C')"
+)
 
 
 class WikipediaArticle(Base):
@@ -33,34 +123,87 @@ class WikipediaArticle(Base):
     __tablename__ = "wikipedia_articles"
 
     __unique_constraint_column__ = "pageid"
+    # summary عمداً نیست: اسنیپت جستجو با عبارت جستجو عوض می‌شود و نباید متن کامل را بازنویسی کند
+    __content_hash_fields__ = ("title", "url", "full_text")
+    __version_fields__ = ("lastrevid",)
 
     id = Column(Integer, primary_key=True, index=True)
     pageid = Column(Integer, unique=True, index=True)
     title = Column(String(500), index=True)
     summary = Column(Text)
     url = Column(String(1000), nullable=True)
-    full_text = Column(Text, nullable=True)
+    # متن کامل فقط در اولین دسترسی بارگیری می‌شود (در async: await article.awaitable_attrs.full_text)
+    full_text = deferred(Column(Text, nullable=True))
+    content_hash = Column(String(64), nullable=True)
+    # از prop=info ویکی‌پدیا؛ برای تشخیص تغییر بدون دانلود دوباره متن
+    lastrevid = Column(BigInteger, nullable=True)
+    touched = Column(DateTime(timezone=True), nullable=True)
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)))
+    # زمان آخرین درج/تغییر؛ high-water mark همگام‌سازی افزایشی کلاینت (/articles/changes)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_wikipedia_articles_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_wikipedia_articles_updated_at_id", "updated_at", "id"),
+    )
 
     def __repr__(self):
         return f"<WikipediaArticle(pageid={self.pageid}, title='{self.title[:30]}...')>"
 
 
 
+# create_all ستون‌های جدید را به جداول موجود اضافه نمی‌کند؛ این دستورات idempotent
+# پایگاه‌داده‌های قدیمی را با مدل هم‌گام می‌کنند.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE wikipedia_articles ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE wikipedia_articles ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({SEARCH_VECTOR_EXPRESSION}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_wikipedia_articles_search_vector "
+    "ON wikipedia_articles USING gin (search_vector)",
+    "ALTER TABLE wikipedia_articles ADD COLUMN IF NOT EXISTS lastrevid BIGINT",
+    "ALTER TABLE wikipedia_articles ADD COLUMN IF NOT EXISTS touched TIMESTAMP WITH TIME ZONE",
+    # فشرده‌سازی lz4 (PostgreSQL 14+) برای متن کامل؛ فقط روی مقادیر جدید اعمال می‌شود
+    "ALTER TABLE wikipedia_articles ALTER COLUMN full_text SET COMPRESSION lz4",
+    # toast_tuple_target پیش‌فرض (~2KB) فقط full_text را بیرون می‌برد؛ مقدار 128 قبلی ستون‌های لیست را هم TOAST می‌کرد
+    "ALTER TABLE wikipedia_articles RESET (toast_tuple_target)",
+    "ALTER TABLE wikipedia_articles ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE "
+    "NOT NULL DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_wikipedia_articles_updated_at_id ON wikipedia_articles (updated_at, id)",
+]
+
+
+def apply_schema_upgrades(conn):
+    for statement in SCHEMA_UPGRADES:
+        try:
+            with conn.begin_nested():
+                conn.execute(text(statement))
+        except Exception as e:
+            print(f"Schema upgrade skipped ({statement[:60]}...): {e}")
+
+
 async def create_db_and_tables_async():
     """جداول را به صورت آسنکرون (برای سرور) ایجاد می‌کند."""
     async with AsyncEngine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(apply_schema_upgrades)
     print("Async: Database tables created (only wikipedia_articles).")
 
 
 def create_db_and_tables_sync():
     """جداول را به صورت سنکرون (برای کلاینت) ایجاد می‌کند."""
     Base.metadata.create_all(bind=SyncEngine)
+    with SyncEngine.begin() as conn:
+        apply_schema_upgrades(conn)
     print("Sync: Database tables created (only wikipedia_articles).")
 
 
 
 async def get_async_db():
-    """یک سشن دیتابیس Async در اختیار endpoint های FastAPI قرار می‌دهد."""
-    async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+    """یک سشن دیتابیس Async (روی engine خواندنی) در اختیار endpoint های FastAPI قرار می‌دهد."""
+    async with AsyncReadSessionLocal() as session:
+        yield session
+
+
+async def dispose_engines():
+    await AsyncEngine.dispose()
+    await AsyncReadEngine.dispose()
@@ -0,0 +1,32 @@
+from server.ratelimit import HostRateLimiter
+
+
+def test_throttle_halves_concurrency():
+    limiter = HostRateLimiter(min_concurrency=2, max_concurrency=10)
+
+    limiter.record_throttle()
+    assert limiter.concurrency == 5
+    limiter.record_throttle()
+    limiter.record_throttle()
+    assert limiter.concurrency == 2
+
+
+def test_consecutive_errors_halve_concurrency():
+    limiter = HostRateLimiter(min_concurrency=2, max_concurrency=10, error_threshold=3)
+
+    limiter.record_error()
+    limiter.record_error()
+    assert limiter.concurrency == 10
+    limiter.record_error()
+    assert limiter.concurrency == 5
+
+    # یک موفقیت شمارش خطاهای پیاپی را از نو شروع می‌کند
+    limiter.record_error()
+    limiter.record_error()
+    limiter.record_success()
+    limiter.record_error()
+    assert limiter.concurrency == 5
+
+    for _ in range(9):
+        limiter.record_error()
+    assert limiter.concurrency == 2
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from server.scheduling import FairScheduler
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class FlakyArqPool(fakeredis.aioredis.FakeRedis):
+    """به جای ArqRedis: enqueue_job بار اول خطا می‌دهد و سپس job را ثبت‌شده گزارش می‌کند."""
+
+    def __init__(self, *args, failures: int = 1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failures = failures
+        self.enqueued = []
+
+    async def enqueue_job(self, function, *args, _job_id=None, _queue_name=None):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("redis blip")
+        self.enqueued.append((function, _job_id, _queue_name))
+        return object()
+
+
+def test_failed_dispatch_keeps_job_pending():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        redis_client = fakeredis.aioredis.FakeRedis(server=server)
+        arq_pool = FlakyArqPool(server=server)
+        scheduler = FairScheduler(redis_client, arq_pool, {"interactive": "arq:queue"})
+
+        assert await scheduler.submit("job-a", "run_crawl_task", [{}], "tenant-1", "interactive")
+        assert await scheduler.submit("job-b", "run_crawl_task", [{}], "tenant-2", "interactive")
+
+        assert await scheduler.dispatch_once() == 0
+        assert await scheduler.is_pending("job-a")
+        assert (await scheduler.stats("interactive"))["pending"] == 2
+
+        assert await scheduler.dispatch_once() == 2
+        assert [job_id for _, job_id, _ in arq_pool.enqueued] == ["job-a", "job-b"]
+        assert not await scheduler.is_pending("job-a")
+        assert not await scheduler.is_pending("job-b")
+
+    asyncio.run(scenario())